@@ -0,0 +1,70 @@
+import random
+import time
+
+from func_lib.emotion import EmotionTimeline, emotions, get_emotion_duration, get_emotion_last_xseconds
+
+SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6) # Timeline entries
+MAX_DICT_ENTRIES = 10 ** 5 # The old {timestamp: emotion} dict is O(n) per call, larger ones take too long
+MIN_SECONDS = 0.2 # Every measurement repeats its call at least this long
+WINDOW = 5.0 # Seconds, the window of the default rules
+
+
+def _changes(entries, seed=0):
+    """entries (timestamp, emotion) pairs, each a different emotion than the one before"""
+    rng = random.Random(seed)
+    timestamp = 0.0
+    emotion = 'neutral'
+    changes = []
+    for _ in range(entries):
+        changes.append((timestamp, emotion))
+        timestamp += rng.uniform(0.05, 2.0)
+        emotion = rng.choice([other for other in emotions if other != emotion])
+    return changes
+
+
+def per_call(fn, min_seconds=MIN_SECONDS):
+    """Seconds per call of fn(), repeated until min_seconds have passed"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def run(sizes=SIZES, max_dict_entries=MAX_DICT_ENTRIES, min_seconds=MIN_SECONDS):
+    results = []
+    for entries in sizes:
+        changes = _changes(entries)
+        start_time = changes[0][0]
+        end_time = changes[-1][0] + 1.0
+        rng = random.Random(1)
+
+        started = time.perf_counter()
+        timeline = EmotionTimeline(start_time, changes[0][1], horizon=float('inf'), max_entries=entries + 1)
+        for timestamp, emotion in changes[1:]:
+            timeline.record(timestamp, emotion)
+        record_seconds = (time.perf_counter() - started) / entries
+
+        def random_window():
+            a = rng.uniform(start_time, end_time - WINDOW)
+            return a, a + WINDOW
+
+        result = {
+            'entries': entries,
+            'record_us': record_seconds * 1e6,
+            'duration_recent_us': per_call(lambda: get_emotion_duration(end_time - WINDOW, end_time, timeline), min_seconds) * 1e6,
+            'duration_random_us': per_call(lambda: get_emotion_duration(*random_window(), timeline), min_seconds) * 1e6,
+            'duration_full_us': per_call(lambda: get_emotion_duration(start_time, end_time, timeline), min_seconds) * 1e6,
+            'last_xseconds_us': per_call(lambda: get_emotion_last_xseconds(WINDOW, timeline, start_time, clock=lambda: end_time), min_seconds) * 1e6,
+        }
+        if entries <= max_dict_entries:
+            # The pre-timeline representation, kept as the baseline
+            legacy = dict(changes)
+            result['dict_duration_recent_us'] = per_call(lambda: get_emotion_duration(end_time - WINDOW, end_time, legacy), min_seconds) * 1e6
+            result['dict_last_xseconds_us'] = per_call(lambda: get_emotion_last_xseconds(WINDOW, legacy, start_time, clock=lambda: end_time), min_seconds) * 1e6
+        results.append(result)
+        print(f"emotion {entries:>8} entries: " + ", ".join(f"{key} {value:.2f}" for key, value in result.items() if key != 'entries'), flush=True)
+    return results
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import time
+
+import cv2
+
+from func_lib.metrics import get_metrics
+from func_lib.replay import SAMPLE_FPS, evaluate, replay
+from func_lib.vision import FaceGate
+
+from benchmarks.standins import StubEmotionModel, write_session_video
+
+VIDEO_SECONDS = 60.0 # Length of the generated recording
+MODEL_LATENCY = 0.0 # Seconds the stub model sleeps per call, 0 measures the pipeline alone
+STAGES = ('face_detect_seconds', 'color_convert_seconds', 'model_seconds')
+
+
+def run(video=None, seconds=VIDEO_SECONDS, sample_fps=SAMPLE_FPS, model_latency=MODEL_LATENCY, triggers_path=None):
+    """
+    Drives the vision pipeline of main.py (face gate, crop, color conversion, model, smoothing,
+    timeline, triggers) with a recording, through replay(). Without a video a synthetic one is
+    generated. The stub model analyzes a center crop when the Haar cascade finds no face, so
+    every sampled frame pays for the whole pipeline.
+    """
+    metrics = get_metrics()
+    was_enabled = metrics.enabled
+    metrics.enabled = True
+    metrics.reset()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if video is None:
+            video = write_session_video(os.path.join(directory, "session.avi"), seconds)
+        if triggers_path is None:
+            triggers_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "triggers.json")
+
+        face_gate = FaceGate(cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml"))
+        model = StubEmotionModel(model_latency)
+        scores = [] # Every analysis in order, replayed without the video below
+
+        def analyze(frame):
+            box = face_gate.locate(frame)
+            if box is None:
+                height, width = frame.shape[:2]
+                box = (width // 4, height // 4, width // 2, height // 2)
+            with metrics.timer('color_convert_seconds'):
+                rgb_face = cv2.cvtColor(face_gate.crop(frame, box), cv2.COLOR_BGR2RGB)
+            with metrics.timer('model_seconds'):
+                analysis = model.analyze(rgb_face)
+            scores.append(analysis[0]['emotion'])
+            return analysis
+
+        result = replay(video, analyze, triggers_path=triggers_path, sample_fps=sample_fps)
+
+        # Smoothing, timeline and triggers alone, on the same scores but without video and model
+        samples = [(i / sample_fps, frame_scores) for i, frame_scores in enumerate(scores)]
+        started = time.perf_counter()
+        evaluate(samples, triggers_path)
+        evaluate_seconds = time.perf_counter() - started
+
+    stages = {name: metrics.summary(name) for name in STAGES}
+    metrics.enabled = was_enabled
+    frames = result['analyzed_frames']
+    summary = {
+        'video_seconds': result['end'] - result['start'],
+        'sample_fps': sample_fps,
+        'model_latency': model_latency,
+        'analyzed_frames': frames,
+        'elapsed': result['elapsed'],
+        'frames_per_second': frames / result['elapsed'] if result['elapsed'] > 0 else None,
+        'speed': result['speed'],
+        'timeline_changes': len(result['timeline']),
+        'triggers': len(result['triggers']),
+        'evaluate_us_per_frame': evaluate_seconds / frames * 1e6 if frames else None,
+    }
+    for name, stage in stages.items():
+        summary[name.replace('_seconds', '_ms')] = stage['mean'] * 1e3 if stage else None
+    print("pipeline: " + ", ".join(f"{key} {value:.3f}" if isinstance(value, float) else f"{key} {value}" for key, value in summary.items()), flush=True)
+    return summary
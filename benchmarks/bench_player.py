@@ -0,0 +1,91 @@
+import functools
+import os
+import tempfile
+import time
+
+from func_lib.music import MixerEngine, SoundCloudPlayer
+from func_lib.transport import SoundcloudAPI, Transport
+
+from benchmarks.standins import SAMPLERATE, SILENCE, FakeSoundCloud, NullOutputStream, silent_runs, write_tone
+
+TRACKS = 3 # Playlist tracks, the interrupt track comes on top
+TRACK_SECONDS = 6.0
+SPEED = 4.0 # The null device plays this many times faster than real time
+AUDIO_FORMAT = 'FLAC'
+MIN_GAP_SECONDS = 0.001 # Shorter silent stretches are zero crossings, not gaps
+TIMEOUT = 60.0
+
+
+def _wait(condition, timeout, interval=0.005):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+
+def run(tracks=TRACKS, track_seconds=TRACK_SECONDS, speed=SPEED, audio_format=AUDIO_FORMAT, chunk_delay=0.0, interrupt=True):
+    """
+    Plays a playlist from a local fake SoundCloud through the real player and transport into
+    a null audio device. Measures the time from start_playlist() to the first audible sample,
+    the latency of an interrupt in the middle of the second track, silent gaps between
+    tracks and decoder underruns.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        extension = audio_format.lower()
+        files = [os.path.basename(write_tone(os.path.join(directory, f"track{i + 1}.{extension}"), track_seconds, 220.0 * (i + 2), format=audio_format))
+                 for i in range(tracks + 1)]
+        server = FakeSoundCloud(directory, files, chunk_delay=chunk_delay).start()
+        transport = Transport()
+        api = SoundcloudAPI(client_id='bench', transport=transport, api_base=server.base)
+        mixer = MixerEngine(samplerate=SAMPLERATE, stream_class=functools.partial(NullOutputStream, speed=speed))
+        player = SoundCloudPlayer(api=api, mixer=mixer)
+        interrupt_id = tracks + 1
+        if interrupt:
+            player.add_interrupt_tracks({'bench': server.track_url(interrupt_id)}, wait=True)
+
+        started = time.perf_counter()
+        player.start_playlist(server.set_url(range(1, tracks + 1)))
+        heard = _wait(lambda: mixer.stream is not None and mixer.stream.first_sound is not None, TIMEOUT)
+        time_to_first_sample = mixer.stream.first_sound - started if heard else None
+
+        interrupt_latency = None
+        if interrupt and heard and tracks >= 2:
+            # Half way into the second track
+            time.sleep(max(0.0, (1.5 * track_seconds) / speed - (time.perf_counter() - mixer.stream.first_sound)))
+            player.interrupt('bench', cause_time=time.time())
+            if _wait(lambda: mixer.last_interrupt_latency is not None, TIMEOUT):
+                interrupt_latency = mixer.last_interrupt_latency - mixer.output_latency # The null device plays without delay
+
+        finished = _wait(lambda: not player.is_playing and mixer.idle, TIMEOUT + (tracks + 1) * track_seconds / speed)
+        elapsed = time.perf_counter() - started
+        mixer_stats = mixer.stats()
+        player.close()
+        server.stop()
+        network = transport.stats()
+        transport.close()
+
+    audio = mixer.stream.audio()
+    gaps = silent_runs(audio, int(MIN_GAP_SECONDS * SAMPLERATE))
+    summary = {
+        'tracks': tracks,
+        'track_seconds': track_seconds,
+        'speed': speed,
+        'format': audio_format,
+        'finished': finished,
+        'elapsed': elapsed,
+        'time_to_first_sample': time_to_first_sample,
+        'interrupt_latency': interrupt_latency,
+        'gaps': len(gaps),
+        'gap_ms_total': sum(gaps) / SAMPLERATE * 1e3,
+        'gap_ms_max': max(gaps) / SAMPLERATE * 1e3 if gaps else 0.0,
+        'underruns': mixer_stats['underruns'],
+        'underrun_frames': mixer_stats['underrun_frames'],
+        'audible_seconds': float((abs(audio).max(axis=1) > SILENCE).sum()) / SAMPLERATE if len(audio) else 0.0, # Crossfades overlap
+        'http_requests': network['requests'],
+        'http_latency_p50': network['latency_p50'],
+        'server_requests': server.requests,
+    }
+    print("player: " + ", ".join(f"{key} {value:.3f}" if isinstance(value, float) else f"{key} {value}" for key, value in summary.items()), flush=True)
+    return summary
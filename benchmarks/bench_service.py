@@ -0,0 +1,98 @@
+import asyncio
+import itertools
+import time
+
+import cv2
+
+from func_lib.metrics import get_metrics
+from func_lib.service import EmotionService, ServiceClient
+
+from benchmarks.standins import CenterGate, StubEmotionModel, session_frames
+
+CLIENTS = 16 # Synthetic desks
+FPS = 10.0 # Frames per second every client sends
+SECONDS = 10.0
+FRAME_SIZE = (320, 240)
+DISTINCT_FRAMES = 50 # Encoded once per client and sent in a loop
+MODEL_LATENCY = 0.02 # Seconds the stub model takes per batched call
+
+
+async def _receive(client, counts):
+    while True:
+        message = await client.receive()
+        if message is None:
+            return
+        counts[message['type']] = counts.get(message['type'], 0) + 1
+
+
+async def _desk(index, port, frames, fps, seconds, counts):
+    """One synthetic client: sends frames at fps for seconds and counts what comes back"""
+    client = await ServiceClient(f"load-{index}").connect(port=port)
+    receiving = asyncio.ensure_future(_receive(client, counts))
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    sent = 0
+    for i, jpeg in enumerate(itertools.cycle(frames)):
+        due = start + i / fps
+        if due - start >= seconds:
+            break
+        await asyncio.sleep(max(0.0, due - loop.time()))
+        await client.send_frame(jpeg)
+        sent += 1
+    await asyncio.sleep(0.2) # Answers to the last frames
+    await client.close()
+    receiving.cancel()
+    return sent
+
+
+async def _run(clients, fps, seconds, model_latency, batch_size, workers):
+    encoder = ServiceClient()
+    frames = [[encoder.encode(frame) for frame in session_frames(DISTINCT_FRAMES / fps, fps, FRAME_SIZE, seed=index + 1)] for index in range(clients)]
+    model = StubEmotionModel(model_latency)
+    service = await EmotionService(model, face_gate_factory=CenterGate, batch_size=batch_size, workers=workers).start(port=0)
+    counts = {}
+    started = time.perf_counter()
+    sent = await asyncio.gather(*(_desk(index, service.port, frames[index], fps, seconds, counts) for index in range(clients)))
+    elapsed = time.perf_counter() - started
+    stats = service.stats()
+    await service.stop()
+    return sum(sent), elapsed, stats, counts, model.calls
+
+
+def run(clients=CLIENTS, fps=FPS, seconds=SECONDS, model_latency=MODEL_LATENCY, batch_size=None, workers=None):
+    """
+    Load generator for the emotion service: `clients` local connections stream JPEG frames at
+    `fps`, the stub model takes model_latency per batch. Shows how many frames were analyzed
+    and dropped, how full the batches got and the latency from frame arrival to its result.
+    """
+    from func_lib.service import BATCH_SIZE, WORKERS
+
+    metrics = get_metrics()
+    was_enabled = metrics.enabled
+    metrics.enabled = True
+    metrics.reset()
+    cv2.setNumThreads(1) # Decoding runs on the service's worker threads already
+
+    sent, elapsed, stats, counts, model_calls = asyncio.run(_run(clients, fps, seconds, model_latency, batch_size or BATCH_SIZE, workers or WORKERS))
+
+    latency = metrics.summary('service_frame_seconds')
+    metrics.enabled = was_enabled
+    summary = {
+        'clients': clients,
+        'fps_per_client': fps,
+        'model_latency': model_latency,
+        'sent': sent,
+        'offered_fps': sent / elapsed,
+        'analyzed_fps': latency['count'] / elapsed if latency else 0.0,
+        'analyzed': latency['count'] if latency else 0,
+        'dropped_share': 1.0 - (latency['count'] if latency else 0) / sent if sent else 0.0,
+        'batches': stats['batches'],
+        'frames_per_batch': stats['frames_per_batch'],
+        'model_calls': model_calls,
+        'frame_latency_ms': latency['mean'] * 1e3 if latency else None,
+        'emotion_updates': counts.get('emotion', 0),
+        'triggers': counts.get('trigger', 0),
+        'errors': counts.get('error', 0),
+    }
+    print("service: " + ", ".join(f"{key} {value:.3f}" if isinstance(value, float) else f"{key} {value}" for key, value in summary.items()), flush=True)
+    return summary
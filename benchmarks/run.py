@@ -0,0 +1,120 @@
+"""
+Benchmarks of the emotion timeline, the vision pipeline and the player, with offline
+stand-ins for camera (a generated or recorded video), model, SoundCloud and audio device,
+and a load generator of synthetic clients for the emotion service.
+Results are written as JSON, one file per commit, so runs can be compared:
+
+python -m benchmarks.run                          all suites -> benchmarks/results/<commit>.json
+python -m benchmarks.run emotion --quick
+python -m benchmarks.run pipeline --video session.mp4 --model-latency 0.05
+python -m benchmarks.run service --clients 48 --model-latency 0.1
+python -m benchmarks.run --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+SUITES = ('emotion', 'pipeline', 'player', 'service')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _git_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(RESULTS_DIR), timeout=10)
+        commit = output.stdout.strip() or None
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, cwd=os.path.dirname(RESULTS_DIR), timeout=10).stdout.strip()
+        return f"{commit}-dirty" if commit and dirty else commit
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _numbers(obj, prefix=''):
+    """Flattens nested results to {'suite.index.key': number}"""
+    if isinstance(obj, dict):
+        items = obj.items()
+    elif isinstance(obj, list):
+        items = ((str(row.get('entries', i)) if isinstance(row, dict) else str(i), row) for i, row in enumerate(obj))
+    else:
+        return {prefix: obj} if isinstance(obj, (int, float)) and not isinstance(obj, bool) else {}
+    numbers = {}
+    for key, value in items:
+        numbers.update(_numbers(value, f"{prefix}.{key}" if prefix else str(key)))
+    return numbers
+
+
+def compare(old_path, new_path):
+    """Prints every number of two result files side by side with the ratio new/old"""
+    with open(old_path, encoding='utf-8') as f:
+        old = _numbers(json.load(f)['results'])
+    with open(new_path, encoding='utf-8') as f:
+        new = _numbers(json.load(f)['results'])
+    for key in sorted(old.keys() & new.keys()):
+        ratio = f"{new[key] / old[key]:.2f}x" if old[key] else "-"
+        print(f"{key:60} {old[key]:>14.4f} {new[key]:>14.4f} {ratio:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the music_feel benchmarks and write the results as JSON.")
+    parser.add_argument('suites', nargs='*', metavar='suite', help=f"Suites to run: {', '.join(SUITES)} (default: all)")
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes and shorter runs, for a quick check")
+    parser.add_argument('--video', help="Recording for the pipeline suite (default: a generated one)")
+    parser.add_argument('--model-latency', type=float, default=0.0, help="Seconds the stub model takes per call")
+    parser.add_argument('--clients', type=int, default=None, help="Synthetic clients of the service suite")
+    parser.add_argument('--speed', type=float, default=None, help="How much faster than real time the null audio device plays")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="Compare two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    unknown = [suite for suite in args.suites if suite not in SUITES]
+    if unknown:
+        parser.error(f"unknown suite {', '.join(unknown)}")
+    suites = args.suites or SUITES
+
+    # Every suite imports only what it needs, e.g. the service suite runs without an audio device
+    results = {}
+    if 'emotion' in suites:
+        from benchmarks import bench_emotion
+
+        sizes = bench_emotion.SIZES[:3] if args.quick else bench_emotion.SIZES
+        results['emotion'] = bench_emotion.run(sizes, min_seconds=0.05 if args.quick else bench_emotion.MIN_SECONDS)
+    if 'pipeline' in suites:
+        from benchmarks import bench_pipeline
+
+        results['pipeline'] = bench_pipeline.run(args.video, seconds=10.0 if args.quick else bench_pipeline.VIDEO_SECONDS, model_latency=args.model_latency)
+    if 'player' in suites:
+        from benchmarks import bench_player
+
+        speed = args.speed or (8.0 if args.quick else bench_player.SPEED)
+        results['player'] = bench_player.run(track_seconds=3.0 if args.quick else bench_player.TRACK_SECONDS, speed=speed)
+    if 'service' in suites:
+        from benchmarks import bench_service
+
+        model_latency = args.model_latency or bench_service.MODEL_LATENCY
+        results['service'] = bench_service.run(clients=args.clients or bench_service.CLIENTS, seconds=3.0 if args.quick else bench_service.SECONDS, model_latency=model_latency)
+
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'quick': args.quick,
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+import http.server
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+import soundfile as sf
+
+from func_lib.batch import EMOTION_LABELS
+
+SAMPLERATE = 44100
+SILENCE = 1e-4 # Output samples below this count as silent
+
+
+def write_tone(path, seconds, frequency, samplerate=SAMPLERATE, format='FLAC'):
+    """
+    Stereo sine tone without any silence in it, so every silent stretch at the output is
+    a gap of the player. FLAC is exact, MP3 adds ~50ms of encoder padding per track.
+    """
+    t = np.arange(int(seconds * samplerate)) / samplerate
+    tone = (0.3 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+    sf.write(path, np.column_stack([tone, tone]), samplerate, format=format)
+    return path
+
+
+def session_frames(seconds=60.0, fps=30.0, size=(640, 480), seed=0):
+    """
+    Synthetic camera: a bright ellipse that wanders over a noisy background and slowly
+    changes its brightness, which is what StubEmotionModel reacts to. Yields BGR frames.
+    """
+    width, height = size
+    rng = np.random.default_rng(seed)
+    # Blurred noise: some texture, but not the pixel noise Haar cascades pay extra for
+    background = cv2.GaussianBlur(rng.integers(20, 100, (height, width, 3), dtype=np.uint8), (0, 0), 6)
+    phase = rng.uniform(0, 2 * np.pi) if seed else 0.0 # Clients of the load generator differ
+    for i in range(int(seconds * fps)):
+        t = i / fps
+        frame = background.copy()
+        center = (int(width / 2 + width / 4 * np.sin(t / 3 + phase)), int(height / 2 + height / 6 * np.cos(t / 2 + phase)))
+        brightness = int(128 + 120 * np.sin(t / 7 + phase))
+        cv2.ellipse(frame, center, (width // 8, height // 5), 0, 0, 360, (brightness, brightness, brightness), -1)
+        yield frame
+
+
+def write_session_video(path, seconds=60.0, fps=30.0, size=(640, 480)):
+    """session_frames() as an MJPG video file"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    for frame in session_frames(seconds, fps, size):
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+class CenterGate:
+    """
+    FaceGate stand-in that always finds a face in the middle of the frame, so every frame
+    pays for the model. Haar detection is measured by the pipeline suite.
+    """
+    def locate(self, frame):
+        height, width = frame.shape[:2]
+        return (width // 4, height // 4, width // 2, height // 2)
+
+    def crop(self, frame, box):
+        x, y, w, h = box
+        return frame[y:y + h, x:x + w]
+
+
+class StubEmotionModel:
+    """
+    Deterministic stand-in for the emotion model: the scores follow the mean brightness of
+    the image (dark -> sad, mid -> neutral, bright -> happy). latency emulates the cost of
+    the real model, once per analyze() and once per batch.
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def _probabilities(self, brightness):
+        happy = np.clip((brightness - 0.55) * 4, 0.0, 1.0)
+        sad = np.clip((0.45 - brightness) * 4, 0.0, 1.0)
+        row = np.full(len(EMOTION_LABELS), 0.02)
+        row[EMOTION_LABELS.index('happy')] += happy
+        row[EMOTION_LABELS.index('sad')] += sad
+        row[EMOTION_LABELS.index('neutral')] += 1.0 - happy - sad
+        return row / row.sum()
+
+    def _wait(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def analyze(self, image):
+        """Same shape as DeepFace.analyze(actions=['emotion'])"""
+        self._wait()
+        row = self._probabilities(float(image.mean()) / 255.0)
+        scores = {label: float(p) * 100 for label, p in zip(EMOTION_LABELS, row)}
+        return [{'emotion': scores, 'dominant_emotion': max(scores, key=scores.get)}]
+
+    def predict_on_batch(self, batch):
+        """Same shape as the Keras model: (faces, 48, 48, 1) scaled to 0..1 -> (faces, 7)"""
+        self._wait()
+        return np.array([self._probabilities(float(face.mean())) for face in batch])
+
+
+class NullOutputStream:
+    """
+    Audio device stand-in with sd.OutputStream's interface. A thread calls the callback at the
+    pace of a real device (`speed` times faster) and keeps everything it outputs, so gaps and
+    the time of the first sound can be measured afterwards.
+    """
+    def __init__(self, samplerate, channels, blocksize, callback, dtype='float32', speed=1.0, **kwargs):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.callback = callback
+        self.speed = speed
+        self.latency = blocksize / samplerate
+        self.blocks = []
+        self.first_sound = None # perf_counter() of the first block with sound in it
+        self.stopped = True
+        self.thread = None
+
+    def start(self):
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        period = self.blocksize / self.samplerate / self.speed
+        deadline = time.perf_counter()
+        while not self.stopped:
+            out = np.zeros((self.blocksize, self.channels), dtype=np.float32)
+            self.callback(out, self.blocksize, None, None)
+            self.blocks.append(out)
+            if self.first_sound is None and np.abs(out).max() > SILENCE:
+                self.first_sound = time.perf_counter()
+            deadline += period
+            time.sleep(max(0.0, deadline - time.perf_counter()))
+
+    def stop(self):
+        self.stopped = True
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def close(self):
+        self.stop()
+
+    def audio(self):
+        return np.concatenate(self.blocks) if self.blocks else np.zeros((0, self.channels), dtype=np.float32)
+
+
+def silent_runs(audio, min_frames):
+    """Lengths of the silent stretches of at least min_frames between the first and the last sound"""
+    loud = np.abs(audio).max(axis=1) > SILENCE if len(audio) else np.zeros(0, dtype=bool)
+    sound = np.flatnonzero(loud)
+    if len(sound) < 2:
+        return []
+    jumps = np.diff(sound) - 1
+    return [int(run) for run in jumps if run >= min_frames]
+
+
+class FakeSoundCloud:
+    """
+    Local HTTP stand-in for the endpoints the player talks to: resolve, tracks?ids=, the
+    progressive stream URL of a track and the audio files themselves (with Range support).
+    Like SoundCloud, a resolved set only has full metadata for its first `preview` tracks.
+    chunk_delay slows every 16 KiB of audio down to emulate a slow connection.
+    """
+    def __init__(self, directory, files, preview=5, chunk_delay=0.0):
+        self.directory = directory
+        self.tracks = {i + 1: name for i, name in enumerate(files)} # track ID -> file name
+        self.preview = preview
+        self.chunk_delay = chunk_delay
+        self.requests = 0
+        self.server = None
+        self.base = None
+
+    def track_url(self, track_id):
+        return f"https://soundcloud.com/bench/{os.path.splitext(self.tracks[track_id])[0]}"
+
+    def set_url(self, track_ids):
+        return "https://soundcloud.com/bench/sets/" + "-".join(str(track_id) for track_id in track_ids)
+
+    def _track(self, track_id):
+        return {
+            'id': track_id,
+            'kind': 'track',
+            'title': self.tracks[track_id],
+            'user': {'username': 'bench'},
+            'media': {'transcodings': [{'format': {'protocol': 'progressive', 'mime_type': 'audio/mpeg'}, 'url': f"{self.base}/media/{track_id}"}]},
+        }
+
+    def _resolve(self, url):
+        path = urlparse(url).path
+        if '/sets/' in path:
+            track_ids = [int(track_id) for track_id in path.rsplit('/', 1)[1].split('-')]
+            stubs = [self._track(track_id) if i < self.preview else {'id': track_id} for i, track_id in enumerate(track_ids)]
+            return {'kind': 'playlist', 'id': 1, 'title': 'Benchmark set', 'tracks': stubs}
+        name = path.rsplit('/', 1)[1]
+        track_id = next(track_id for track_id, file_name in self.tracks.items() if os.path.splitext(file_name)[0] == name)
+        return self._track(track_id)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive, like the real thing
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, obj):
+                body = json.dumps(obj).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                fake.requests += 1
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == '/resolve':
+                    return self._send_json(fake._resolve(query['url'][0]))
+                if url.path == '/tracks':
+                    return self._send_json([fake._track(int(track_id)) for track_id in query['ids'][0].split(',')])
+                if url.path.startswith('/media/'):
+                    track_id = int(url.path.rsplit('/', 1)[1])
+                    return self._send_json({'url': f"{fake.base}/audio/{fake.tracks[track_id]}"})
+                if url.path.startswith('/audio/'):
+                    return self._send_audio(os.path.join(fake.directory, os.path.basename(url.path)))
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def _send_audio(self, path):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                first, last = 0, len(data) - 1
+                match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if match:
+                    first = int(match.group(1))
+                    last = int(match.group(2)) if match.group(2) else last
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {first}-{last}/{len(data)}")
+                else:
+                    self.send_response(200)
+                body = data[first:last + 1]
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+                for i in range(0, len(body), 16384):
+                    try:
+                        self.wfile.write(body[i:i + 16384])
+                    except OSError:
+                        return # The player closed the connection
+                    if fake.chunk_delay:
+                        time.sleep(fake.chunk_delay)
+
+        return Handler
+
+    def start(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,174 @@
+import itertools
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from func_lib.metrics import get_metrics
+from func_lib.replay import SAMPLE_FPS, decode_ahead, evaluate, read_frames
+from func_lib.triggers import TRIGGERS_FILE
+from func_lib.vision import FaceGate
+
+BATCH_SIZE = 64 # Face crops per forward pass of the emotion model
+SHARDS_PER_WORKER = 4 # More ranges than workers, so a worker that finishes early picks up another one
+MIN_SHARD_SECONDS = 30.0 # Shorter ranges are not worth the seek and the extra face detection warm-up
+THREADS_PER_WORKER = 1 # TensorFlow and OpenCV threads per process, the pool provides the parallelism
+MODEL_INPUT = 48 # DeepFace's emotion model takes 48x48 grayscale faces
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral'] # Output order of the model
+
+_worker = {} # State of a pool process, filled once by _init_worker()
+
+
+def load_emotion_model():
+    """The Keras model behind DeepFace.analyze(actions=['emotion'])"""
+    from deepface import DeepFace
+
+    try:
+        client = DeepFace.build_model(task='facial_attribute', model_name='Emotion')
+    except TypeError:
+        client = DeepFace.build_model('Emotion') # deepface before 0.0.93
+    return getattr(client, 'model', client)
+
+
+def _init_worker(threads=THREADS_PER_WORKER):
+    """Runs once per pool process: limits its threads and loads the model for all its ranges"""
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = str(threads)
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    cv2.setNumThreads(threads)
+    _worker['model'] = load_emotion_model()
+
+
+def video_duration(path):
+    """Length of a video in seconds, None if the container does not tell"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise OSError(f"Cannot open video {path}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    finally:
+        cap.release()
+    return frames / fps if frames > 0 else None
+
+
+def shard_ranges(start, end, shards, sample_fps=SAMPLE_FPS):
+    """
+    Splits [start, end) into at most `shards` (start, end) ranges. The bounds lie on the
+    sampling grid, so together the ranges yield the same frames as a single pass.
+    """
+    step = 1.0 / sample_fps if sample_fps else (end - start) / max(1, shards)
+    steps = max(1, int(math.ceil((end - start) / step - 1e-9)))
+    per_shard = int(math.ceil(steps / max(1, shards)))
+    # Rounded to microseconds, start + 34 * 0.2 would be 6.800000000000001 and not a grid point
+    return [(round(start + first * step, 6), min(end, round(start + (first + per_shard) * step, 6))) for first in range(0, steps, per_shard)]
+
+
+class FaceBatch:
+    """Preprocessed face crops waiting for one forward pass of the emotion model"""
+    def __init__(self, model, size=BATCH_SIZE):
+        self.model = model
+        self.inputs = np.empty((size, MODEL_INPUT, MODEL_INPUT, 1), dtype=np.float32)
+        self.owners = [] # Sample index of every crop in the batch
+        self.passes = 0
+
+    def full(self):
+        return len(self.owners) == len(self.inputs)
+
+    def add(self, owner, crop):
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        self.inputs[len(self.owners), :, :, 0] = cv2.resize(gray, (MODEL_INPUT, MODEL_INPUT), interpolation=cv2.INTER_AREA)
+        self.owners.append(owner)
+
+    def run(self):
+        """[(sample index, {emotion: score in percent})] for the crops added since the last run"""
+        count = len(self.owners)
+        if not count:
+            return []
+        batch = self.inputs[:count] / 255.0 # DeepFace feeds the model faces scaled to 0..1
+        with get_metrics().timer('model_seconds'):
+            probabilities = np.asarray(self.model.predict_on_batch(batch))
+        self.passes += 1
+        results = [(owner, {label: float(score) * 100 for label, score in zip(EMOTION_LABELS, row / max(row.sum(), 1e-12))}) for owner, row in zip(self.owners, probabilities)]
+        self.owners = []
+        return results
+
+
+def analyze_range(path, start, end, sample_fps=SAMPLE_FPS, batch_size=BATCH_SIZE, model=None):
+    """
+    (seconds into the video, emotion scores) for every sampled frame in [start, end),
+    None for frames without a face.
+    Face gating runs per frame, the face crops go through the model batch_size at a time.
+    model defaults to the one the pool process loaded.
+    """
+    face_gate = FaceGate(cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml"))
+    batch = FaceBatch(model if model is not None else _worker['model'], batch_size)
+    timestamps = []
+    scores = []
+
+    def flush():
+        for index, face_scores in batch.run():
+            scores[index] = face_scores
+
+    for timestamp, frame in decode_ahead(read_frames(path, sample_fps, start, end)):
+        box = face_gate.locate(frame)
+        timestamps.append(timestamp)
+        scores.append(None)
+        if box is not None:
+            batch.add(len(scores) - 1, face_gate.crop(frame, box))
+            if batch.full():
+                flush()
+    flush()
+    return {'samples': list(zip(timestamps, scores)), 'faces': face_gate.stats(), 'passes': batch.passes}
+
+
+def batch_replay(path, workers=None, triggers_path=TRIGGERS_FILE, sample_fps=SAMPLE_FPS, start=0.0, end=None, session_start=0.0, batch_size=BATCH_SIZE):
+    """
+    replay() for long recordings: the video is split into time ranges that a pool of
+    `workers` processes (default: all cores) analyze in parallel, each process loads the
+    model once. The ranges' samples are merged in order and evaluated in one pass, so
+    the result is the same as a single-process replay with the same model.
+    """
+    workers = workers or os.cpu_count() or 1
+    if end is None:
+        end = video_duration(path)
+    if end is None:
+        ranges = [(start, None)] # Unknown length, nothing to split
+    else:
+        shards = min(workers * SHARDS_PER_WORKER, int((end - start) // MIN_SHARD_SECONDS))
+        ranges = shard_ranges(start, end, max(1, shards), sample_fps)
+
+    started = time.perf_counter()
+    shards = []
+    errors = 0
+    # TensorFlow does not survive a fork, every process starts fresh
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=context, initializer=_init_worker) as pool:
+        futures = [pool.submit(analyze_range, path, first, last, sample_fps, batch_size) for first, last in ranges]
+        for (first, last), future in zip(ranges, futures):
+            try:
+                shards.append(future.result())
+            except Exception as e:
+                errors += 1
+                print(f"Error analyzing {first:.1f}s-{last or 0:.1f}s: {e}", flush=True)
+
+    result = evaluate(itertools.chain.from_iterable(shard['samples'] for shard in shards), triggers_path, start, session_start)
+    elapsed = time.perf_counter() - started
+
+    duration = result['end'] - result['start']
+    result.update({
+        'video': path,
+        'analyzed_frames': sum(len(shard['samples']) for shard in shards),
+        'errors': errors, # Ranges that failed, their time counts for the emotion before them
+        'workers': min(workers, len(ranges)),
+        'shards': len(ranges),
+        'model_passes': sum(shard['passes'] for shard in shards),
+        'faces': {key: sum(shard['faces'][key] for shard in shards) for key in ('detections', 'reused', 'absent')},
+        'elapsed': elapsed,
+        'speed': duration / elapsed if elapsed > 0 else None, # x real time
+    })
+    return result
@@ -0,0 +1,265 @@
+import io
+import json
+import mmap
+import os
+import threading
+import time
+import uuid
+
+# Where downloaded tracks are kept between runs
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "music_feel", "tracks")
+MAX_CACHE_BYTES = 2 * 1024 * 1024 * 1024 # 2 GB
+INDEX_FILE = "index.json"
+INDEX_SAVE_INTERVAL = 60.0 # Seconds a cache hit's access time may stay unsaved, it only orders evictions
+
+
+class MappedFile:
+    """
+    Read-only file-like object over a memory-mapped file, for soundfile.
+    Reads are served straight from the page cache, no copy of the file is kept in RAM.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._pos = 0
+
+    def __len__(self):
+        return len(self._map)
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._map)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self._map) - self._pos
+        data = self._map[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        try:
+            self._map.close()
+        finally:
+            self._file.close()
+
+
+class CachedTrack:
+    """Minimal track object for a cache hit, so no SoundCloud resolve is needed"""
+    def __init__(self, track_id, title):
+        self.id = track_id
+        self.title = title
+
+    def get_stream_url(self):
+        return None
+
+
+class CacheWriter:
+    """Collects the bytes of one download, only becomes visible in the cache on commit()"""
+    def __init__(self, cache, track_id, title):
+        self.cache = cache
+        self.track_id = track_id
+        self.title = title
+        self.size = 0
+        self.tmp_path = os.path.join(cache.directory, f".{track_id}.{uuid.uuid4().hex}.part")
+        self._file = open(self.tmp_path, 'wb')
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self, expected_size=None):
+        self._file.close()
+        if self.size == 0 or (expected_size is not None and self.size != expected_size):
+            self.discard()
+            return False
+        self.cache._add(self.track_id, self.title, self.tmp_path, self.size)
+        return True
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+class TrackCache:
+    """
+    Persistent on-disk cache of compressed track streams, keyed by SoundCloud track ID.
+    Also remembers which URL resolved to which track, so a cached interrupt track
+    can start without any network traffic. The least recently used tracks are
+    evicted once the cache grows beyond max_bytes.
+    """
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.unsaved_access = False # last_access changed in memory since the index was written
+        self.saved_at = time.time()
+        os.makedirs(self.directory, exist_ok=True)
+        self.index = self._load_index()
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault('tracks', {})
+        index.setdefault('urls', {})
+        # Drop entries whose file went missing
+        for track_id in list(index['tracks']):
+            if not os.path.exists(self.path(track_id)):
+                del index['tracks'][track_id]
+        return index
+
+    def _save_index(self):
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self._index_path())
+        self.unsaved_access = False
+        self.saved_at = time.time()
+
+    def path(self, track_id):
+        return os.path.join(self.directory, f"{track_id}.audio")
+
+    @property
+    def size(self):
+        return sum(entry['size'] for entry in self.index['tracks'].values())
+
+    def contains(self, track_id):
+        return track_id is not None and str(track_id) in self.index['tracks']
+
+    def lookup_url(self, url):
+        """Returns a CachedTrack if the URL was resolved before and its audio is cached"""
+        with self.lock:
+            track_id = self.index['urls'].get(url)
+            entry = self.index['tracks'].get(track_id) if track_id else None
+            if entry is None:
+                return None
+            return CachedTrack(int(track_id) if track_id.isdigit() else track_id, entry['title'])
+
+    def remember_url(self, url, track):
+        with self.lock:
+            if self.index['urls'].get(url) != str(track.id):
+                self.index['urls'][url] = str(track.id)
+                self._save_index()
+
+    def open(self, track_id):
+        """Memory-maps a cached track, returns None on a miss"""
+        with self.lock:
+            entry = self.index['tracks'].get(str(track_id))
+            if entry is None:
+                self.misses += 1
+                return None
+            try:
+                mapped = MappedFile(self.path(track_id))
+            except (OSError, ValueError) as e:
+                print(f"Error opening cached track {track_id}: {e}", flush=True)
+                del self.index['tracks'][str(track_id)]
+                self._save_index()
+                self.misses += 1
+                return None
+            self.hits += 1
+            # A hit only refreshes the access time, it is written with the next change, on close() or after a while
+            entry['last_access'] = time.time()
+            self.unsaved_access = True
+            if entry['last_access'] - self.saved_at > INDEX_SAVE_INTERVAL:
+                self._save_index()
+            return mapped
+
+    def writer(self, track_id, title):
+        """Returns a CacheWriter for a download, commit() it once the download is complete"""
+        return CacheWriter(self, str(track_id), title)
+
+    def store(self, track_id, title, data):
+        writer = self.writer(track_id, title)
+        writer.write(data)
+        return writer.commit()
+
+    def _add(self, track_id, title, tmp_path, size):
+        with self.lock:
+            os.replace(tmp_path, self.path(track_id))
+            self.index['tracks'][track_id] = {'title': title, 'size': size, 'last_access': time.time()}
+            self._evict(keep=track_id)
+            self._save_index()
+
+    def _evict(self, keep=None):
+        """Removes least recently used tracks until the cache fits into max_bytes"""
+        tracks = self.index['tracks']
+        total = sum(entry['size'] for entry in tracks.values())
+        for track_id in sorted(tracks, key=lambda t: tracks[t]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if track_id == keep:
+                continue
+            try:
+                os.remove(self.path(track_id))
+            except OSError as e:
+                # Still mapped by a player (Windows), try again next time
+                print(f"Could not evict cached track {track_id}: {e}", flush=True)
+                continue
+            total -= tracks.pop(track_id)['size']
+        self.index['urls'] = {url: t for url, t in self.index['urls'].items() if t in tracks}
+
+    def close(self):
+        """Writes access times that are only in memory so far"""
+        with self.lock:
+            if self.unsaved_access:
+                self._save_index()
+
+    def stats(self):
+        with self.lock:
+            return {'tracks': len(self.index['tracks']), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+class LocalTrack:
+    """Track stand-in backed by a local audio file"""
+    def __init__(self, track_id, title, path):
+        self.id = track_id
+        self.title = title
+        self.path = path
+
+    def get_stream_url(self):
+        return None
+
+
+class LocalDirectoryAPI:
+    """
+    Offline stand-in for sclib.SoundcloudAPI.
+    resolve() matches the last segment of a SoundCloud URL (without query) against
+    the audio files in a directory, e.g. .../trumpet-fanfare-2 -> trumpet-fanfare-2.mp3
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def resolve(self, url):
+        name = url.split('?')[0].rstrip('/').split('/')[-1]
+        for file_name in sorted(os.listdir(self.directory)):
+            stem, _ = os.path.splitext(file_name)
+            if stem == name:
+                path = os.path.join(self.directory, file_name)
+                return LocalTrack(f"local-{stem}", stem, path)
+        raise FileNotFoundError(f"No local file for {url} in {self.directory}")
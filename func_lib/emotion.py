@@ -1,10 +1,220 @@
+import collections
+import math
 import time
+from array import array
+from bisect import bisect_right
+
+import numpy as np
+
 emotions = ['happy', 'sad', 'angry','neutral', 'surprise', 'fear', 'disgust']
+ABSENT = 'absent' # Recorded in the timeline while no face is in front of the camera
+
+# How much history an EmotionTimeline keeps around (seconds / entries)
+RETENTION_SECONDS = 10 * 60
+MAX_ENTRIES = 50000
+
+# Smoothing of the per-frame emotion scores
+SMOOTHING_SECONDS = 0.75 # Time constant of the EWMA, a clear change wins after ~0.6s, a single odd frame does not
+SMOOTHING_WINDOWS = (5.0,) # Windows (seconds) whose mean scores are kept as running sums
+
+
+class EmotionTimeline:
+    """
+    Bounded replacement for the emotion_changes dict.
+    Every entry is a start time + emotion, the emotion lasts until the next entry.
+    Per emotion a prefix sum of durations is kept, so the time spent in each emotion
+    inside any window [a, b] is two bisects and a subtraction.
+    Entries older than the retention horizon are dropped, so memory stays constant.
+    Timestamps come from the caller, clock only provides the default start time.
+    """
+    def __init__(self, start_time=None, initial_emotion='neutral', horizon=RETENTION_SECONDS, max_entries=MAX_ENTRIES, clock=time.time):
+        self.labels = emotions + [ABSENT]
+        self.horizon = horizon
+        self.max_entries = max_entries
+
+        self._index = {emotion: i for i, emotion in enumerate(self.labels)}
+        self._timestamps = array('d')
+        self._codes = array('b')
+        # _totals[e][i] -> seconds spent in emotion e from the first entry up to _timestamps[i]
+        self._totals = [array('d') for _ in self.labels]
+        self._first = 0 # Index of the oldest live entry, everything before is waiting for compaction
+
+        self.record(clock() if start_time is None else start_time, initial_emotion, force=True)
+
+    def __len__(self):
+        return len(self._timestamps) - self._first
+
+    @property
+    def start_time(self):
+        return self._timestamps[self._first]
+
+    @property
+    def current(self):
+        """The emotion of the most recent entry"""
+        return self.labels[self._codes[-1]]
+
+    @property
+    def last_change(self):
+        return self._timestamps[-1]
+
+    def record(self, timestamp, emotion, force=False):
+        """
+        Add an entry if the emotion changed (or force is set).
+        Returns True if an entry was added.
+        """
+        code = self._index[emotion]
+        if self._timestamps:
+            if not force and self._codes[-1] == code:
+                return False
+            last = self._timestamps[-1]
+            timestamp = max(timestamp, last) # Keep the timestamps sorted for bisect
+            elapsed = timestamp - last
+            previous = self._codes[-1]
+            for e, totals in enumerate(self._totals):
+                totals.append(totals[-1] + elapsed if e == previous else totals[-1])
+        else:
+            for totals in self._totals:
+                totals.append(0.0)
+        self._timestamps.append(timestamp)
+        self._codes.append(code)
+        self._evict()
+        return True
+
+    def _evict(self):
+        # The entry covering (now - horizon) has to stay, only the ones before it can go
+        cutoff = self._timestamps[-1] - self.horizon
+        keep_from = max(bisect_right(self._timestamps, cutoff, self._first) - 1, self._first)
+        keep_from = max(keep_from, len(self._timestamps) - self.max_entries)
+        self._first = keep_from
+        # Compact once the dead prefix is larger than the live part -> amortized O(1)
+        if self._first > len(self) and self._first > 64:
+            del self._timestamps[:self._first]
+            del self._codes[:self._first]
+            for totals in self._totals:
+                del totals[:self._first]
+            self._first = 0
+
+    def _accumulated(self, t):
+        """Seconds per emotion (as codes) from the oldest live entry up to time t"""
+        i = bisect_right(self._timestamps, t, self._first) - 1
+        if i < self._first:
+            return [totals[self._first] for totals in self._totals]
+        code = self._codes[i]
+        elapsed = t - self._timestamps[i]
+        return [totals[i] + elapsed if e == code else totals[i] for e, totals in enumerate(self._totals)]
+
+    def durations(self, a, b):
+        """Seconds spent in every emotion inside [a, b]"""
+        if b < a:
+            a, b = b, a
+        start = self._accumulated(a)
+        end = self._accumulated(b)
+        return {label: end[e] - start[e] for e, label in enumerate(self.labels)}
+
+    def distribution(self, a, b):
+        """Percentage of [a, b] spent in every emotion, same format as get_emotion_duration"""
+        emotion_durations = self.durations(a, b)
+        total_duration = sum(emotion_durations.values())
+        if total_duration > 0:
+            return {emotion: (duration / total_duration) * 100 for emotion, duration in emotion_durations.items()}
+        return {emotion: 0.0 for emotion in emotion_durations}
+
+
+class EmotionSmoother:
+    """
+    Streaming smoothing of the full per-frame score vector (DeepFace's 'emotion' dict)
+    instead of only its dominant label. Every update is O(1): a time-decayed EWMA with
+    time constant tau, and per window a running, time-weighted sum (a frame's scores hold
+    until the next frame, like the entries of a timeline).
+    `dominant` is the argmax of the EWMA, recording it instead of the raw label keeps
+    single noisy frames out of the timeline.
+    """
+    def __init__(self, tau=SMOOTHING_SECONDS, windows=SMOOTHING_WINDOWS, labels=None):
+        self.labels = list(labels) if labels is not None else emotions + [ABSENT]
+        self.tau = tau
+        self._index = {label: i for i, label in enumerate(self.labels)}
+        self.ewma = np.zeros(len(self.labels))
+        self.last = None # Score vector of the last frame
+        self.last_time = None
+        # window -> (deque of (start, end, scores * seconds), running sum of the deque)
+        self._windows = {float(window): (collections.deque(), np.zeros(len(self.labels))) for window in windows}
+        self.updates = 0
+
+    def vector(self, scores):
+        """Probability vector in label order from percent scores, None (no face) -> absent"""
+        vector = np.zeros(len(self.labels))
+        if scores:
+            for label, score in scores.items():
+                i = self._index.get(label)
+                if i is not None:
+                    vector[i] = score
+        total = vector.sum()
+        if total <= 0:
+            vector[self._index[ABSENT]] = 1.0
+            return vector
+        return vector / total
+
+    def update(self, timestamp, scores):
+        """Adds one frame, returns the smoothed dominant emotion"""
+        vector = self.vector(scores)
+        if self.last_time is None:
+            self.ewma[:] = vector
+        else:
+            elapsed = max(0.0, timestamp - self.last_time)
+            alpha = 1.0 - math.exp(-elapsed / self.tau) if self.tau > 0 else 1.0
+            self.ewma += alpha * (vector - self.ewma)
+            weighted = self.last * elapsed
+            for window, (entries, total) in self._windows.items():
+                entries.append((self.last_time, timestamp, weighted))
+                total += weighted
+                # Whole frames that ended before the window, the oldest one may still overlap it
+                while entries and entries[0][1] <= timestamp - window:
+                    total -= entries.popleft()[2]
+        self.last = vector
+        self.last_time = timestamp if self.last_time is None else max(timestamp, self.last_time)
+        self.updates += 1
+        return self.dominant
+
+    @property
+    def dominant(self):
+        return self.labels[int(np.argmax(self.ewma))]
+
+    @property
+    def confidence(self):
+        """Smoothed score of the dominant emotion in percent"""
+        return float(self.ewma.max()) * 100
+
+    def _as_distribution(self, vector):
+        vector = np.maximum(vector, 0.0) # Running sums can drift a hair below zero
+        total = float(vector.sum())
+        if total <= 0:
+            return {label: 0.0 for label in self.labels}
+        return {label: float(value) * 100 / total for label, value in zip(self.labels, vector)}
+
+    def distribution(self):
+        """EWMA of the scores in percent, same format as EmotionTimeline.distribution"""
+        return self._as_distribution(self.ewma)
+
+    def window_distribution(self, window):
+        """Mean scores in percent over the last `window` seconds up to the last frame"""
+        entries, total = self._windows[float(window)]
+        if not entries:
+            return self._as_distribution(self.last if self.last is not None else self.ewma)
+        vector = total.copy()
+        start, end, weighted = entries[0]
+        cutoff = self.last_time - window
+        if start < cutoff < end:
+            vector -= weighted * ((cutoff - start) / (end - start))
+        return self._as_distribution(vector)
+
 
 def get_emotion_duration(a,b,emotion_changes):
     """
     In an Intervall [a, b] get the amount of all emotions in that timeframe
     """
+    if hasattr(emotion_changes, 'distribution'): # EmotionTimeline or RoomMood
+        return emotion_changes.distribution(a, b)
+
     # Get the keys (timestamps) from the dictionary
     timestamps = list(emotion_changes.keys())
     
@@ -39,14 +249,14 @@ def get_emotion_duration(a,b,emotion_changes):
     
     return emotion_durations  
 
-def get_emotion_last_xseconds(seconds, emotion_changes, start_time):
-    if time.time() - seconds  < start_time:
+def get_emotion_last_xseconds(seconds, emotion_changes, start_time, clock=time.time):
+    now = clock()
+    if now - seconds  < start_time:
         last_time = start_time
     else:
-        last_time = time.time() - seconds
+        last_time = now - seconds
     # Get the biggest emotion in the last 5 seconds
-    x_sec_distribution = get_emotion_duration(last_time, time.time(),emotion_changes)
-    last_time = time.time()
+    x_sec_distribution = get_emotion_duration(last_time, now,emotion_changes)
     max_emotion = max(x_sec_distribution, key=x_sec_distribution.get)
     certainty = x_sec_distribution[max_emotion]
     if certainty < 30.0:
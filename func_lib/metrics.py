@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "music_feel_" # Prefix of every exported metric name
+EXPORT_INTERVAL = 5.0 # Seconds between two writes of the metrics file
+# Histogram bucket bounds in seconds, from a camera read to a track download
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Everything the app records, names ending in _total are counters, the rest are histograms in seconds
+DESCRIPTIONS = {
+    'capture_read_seconds': "Time cap.read() takes to deliver a camera frame",
+    'face_detect_seconds': "Haar face detection on the downscaled frame",
+    'color_convert_seconds': "BGR to RGB conversion of the face crop",
+    'model_seconds': "Emotion model call (DeepFace.analyze or one batched forward pass)",
+    'inference_seconds': "Whole analyze(frame) call of the inference stage",
+    'timeline_update_seconds': "Smoothing and recording one analysis in the emotion timeline",
+    'trigger_evaluate_seconds': "Evaluation of all trigger rules after a timeline update",
+    'tts_render_seconds': "Rendering a batch of announcements to audio",
+    'soundcloud_resolve_seconds': "api.resolve() of a track or playlist URL",
+    'http_first_byte_seconds': "HTTP request until the response headers arrived (time to first byte of downloads)",
+    'audio_decode_seconds': "Decoding and resampling one block of a track",
+    'audio_callback_seconds': "Time spent in the audio callback per block",
+    'service_frame_seconds': "Emotion service: frame received until its analysis was applied to the client's timeline",
+    'expression_to_interrupt_seconds': "Camera frame that fired a trigger until the first sample of its interrupt track is played",
+    'audio_underflows_total': "Output underflows reported by the audio device",
+    'audio_overflows_total': "Output overflows reported by the audio device",
+    'audio_decoder_underruns_total': "Audio callbacks the decoder could not fill completely",
+    'triggers_fired_total': "Trigger rules that fired",
+}
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values, Prometheus style"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self.lock:
+            counts = list(self.counts)
+            return counts, self.sum, self.count
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    """What timer() returns while metrics are disabled: nothing is measured"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    Latency histograms and counters of all pipeline stages, exported as Prometheus text
+    to a file and/or a local HTTP endpoint. Disabled (the default) every call returns
+    right after one attribute check, so the instrumentation can stay in the hot paths.
+    """
+    def __init__(self, enabled=False, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock() # Only for creating metrics
+        self.server = None
+        self.export_thread = None
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, name, seconds):
+        if self.enabled:
+            self.histogram(name).observe(seconds)
+
+    def timer(self, name):
+        """with metrics.timer('model_seconds'): ... records how long the block took"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.histogram(name))
+
+    def inc(self, name, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self, name):
+        """count, mean and total of a histogram in seconds, None if nothing was recorded"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            return None
+        _, total, count = histogram.snapshot()
+        return {'count': count, 'mean': total / count if count else 0.0, 'total': total}
+
+    def reset(self):
+        """Drops everything recorded so far"""
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, histogram in sorted(self.histograms.items()):
+            counts, total, count = histogram.snapshot()
+            full_name = PREFIX + name
+            if name in DESCRIPTIONS:
+                lines.append(f"# HELP {full_name} {DESCRIPTIONS[name]}")
+            lines.append(f"# TYPE {full_name} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{full_name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{full_name}_sum {total}")
+            lines.append(f"{full_name}_count {count}")
+        with self.lock:
+            counters = sorted(self.counters.items())
+        for name, value in counters:
+            full_name = PREFIX + name
+            if name in DESCRIPTIONS:
+                lines.append(f"# HELP {full_name} {DESCRIPTIONS[name]}")
+            lines.append(f"# TYPE {full_name} counter")
+            lines.append(f"{full_name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes render() to path, replaced in one step so a scraper never reads half a file"""
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+    def _export_loop(self, path, interval):
+        while self.enabled:
+            time.sleep(interval)
+            try:
+                self.write(path)
+            except OSError as e:
+                print(f"Error writing metrics to {path}: {e}", flush=True)
+
+    def serve(self, port, host='127.0.0.1'):
+        """Answers every GET on host:port with render(), on a daemon thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # No line per scrape
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Metrics on http://{host}:{port}/metrics", flush=True)
+
+    def start(self, path=None, port=None, interval=EXPORT_INTERVAL):
+        """Enables recording and exports to a file every interval seconds and/or on a local port"""
+        self.enabled = True
+        if port:
+            self.serve(port)
+        if path and self.export_thread is None:
+            self.export_thread = threading.Thread(target=self._export_loop, args=(path, interval), daemon=True)
+            self.export_thread.start()
+
+    def stop(self):
+        self.enabled = False
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+
+_shared = Metrics()
+
+
+def get_metrics():
+    """The Metrics shared by the whole process, disabled until start() is called"""
+    return _shared
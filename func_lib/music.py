@@ -1,150 +1,1045 @@
-import sclib
 import requests
 import sounddevice as sd
 import io
 import soundfile as sf
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np # Import numpy for silence generation
 
+from func_lib.cache import MappedFile
+from func_lib.metrics import get_metrics
+from func_lib.playlist import resolve_playlist
+from func_lib.transport import SoundcloudAPI, get_transport
+
 # Define buffer size for audio chunks
 BLOCK_SIZE = 1024 * 4 # Adjust as needed for performance/latency balance
 
-class SoundCloudPlayer:
-    def __init__(self):
-        self.api = sclib.SoundcloudAPI()
-        self.playlist = None
-        self.current_track_index = 0
-        self.is_playing = False      
-        self.is_paused = False       
-        self.is_interrupted = False  
-        self.stop_requested = False  
-        self.interrupt_track_url = None
+# Streaming settings
+CHUNK_SIZE = 64 * 1024 # Size of the HTTP chunks fed to the decoder
+MAX_COMPRESSED_BYTES = 2 * 1024 * 1024 # Compressed data kept ahead of the decoder
+KEEP_BEHIND_BYTES = 256 * 1024 # Compressed data kept behind the decoder for small seeks
+BUFFER_SECONDS = 10.0 # Decoded audio kept ahead of playback
+PREROLL_SECONDS = 1.0 # Decoded audio needed before playback starts
 
-        self.lock = threading.Lock() 
-        self.pause_event = threading.Event() 
-        self.stream_finished_event = threading.Event() 
+# Interrupt tracks
+WARM_BYTES = 256 * 1024 # Start of every interrupt track kept in memory (~10s of 128kbit/s mp3)
+STREAM_URL_TTL = 5 * 60 # SoundCloud stream URLs are signed and expire, refresh them before that
 
+# Announcements
+DUCK_GAIN = 0.3 # Music volume while an announcement plays over it
 
-        self.stream = None           
-        self.current_sf = None       
-        self.current_response = None 
-        self.stream_thread = None    
+# Mixer
+MIXER_SAMPLERATE = 44100 # The output stream always runs at this rate, sources are resampled to it
+MIXER_CHANNELS = 2
+CROSSFADE_SECONDS = 1.5 # Fade between the playlist and interrupt tracks
+PLAYLIST_CROSSFADE_SECONDS = 0.0 # Fade between two playlist tracks, 0 = gapless
+FADE_OUT_SECONDS = 0.05 # Short fade on stop, avoids a click
+POLL_INTERVAL = 0.02 # How often the playlist loop checks on its sources
+CALLBACK_TIMING_SLOTS = 256 # Callback durations kept until the housekeeping thread publishes them
 
-        self.pause_event.set() 
+metrics = get_metrics()
 
-    def _audio_callback(self, outdata, frames, time_info, status):
-        if status:
-            print("Stream status:", status, flush=True)
 
+def resample(data, src_rate, dst_rate):
+    """Linear interpolation resampling of (frames, channels) float32 audio"""
+    if src_rate == dst_rate or data.shape[0] == 0:
+        return np.ascontiguousarray(data, dtype=np.float32)
+    frames = int(round(data.shape[0] * dst_rate / src_rate))
+    src_positions = np.arange(data.shape[0], dtype=np.float64)
+    dst_positions = np.arange(frames, dtype=np.float64) * (src_rate / dst_rate)
+    out = np.empty((frames, data.shape[1]), dtype=np.float32)
+    for channel in range(data.shape[1]):
+        out[:, channel] = np.interp(dst_positions, src_positions, data[:, channel])
+    return out
 
-        with self.lock:
 
-            if self.stop_requested or self.is_interrupted:
-                outdata[:] = 0 
-                self.stream_finished_event.set()
-                raise sd.CallbackStop("Playback stopped or interrupted.")
+class AudioClip:
+    """Short in-memory audio (e.g. a rendered announcement), converted once per output format"""
+    def __init__(self, data, samplerate):
+        self.data = np.asarray(data, dtype=np.float32).reshape(len(data), -1)
+        self.samplerate = samplerate
+        self._rendered = {}
 
-            if self.is_paused:
+    @property
+    def duration(self):
+        return self.data.shape[0] / self.samplerate
 
-                self.lock.release()
-                self.pause_event.wait() 
-                self.lock.acquire() 
-                if self.stop_requested or self.is_interrupted:
-                    outdata[:] = 0
-                    self.stream_finished_event.set()
-                    raise sd.CallbackStop("Playback stopped or interrupted post-pause.")
+    def render(self, samplerate, channels):
+        """The clip as (frames, channels) float32 at the given rate, memoized"""
+        key = (samplerate, channels)
+        if key not in self._rendered:
+            data = resample(self.data, self.samplerate, samplerate)
+            if data.shape[1] != channels:
+                data = np.repeat(data.mean(axis=1, keepdims=True), channels, axis=1)
+            self._rendered[key] = np.ascontiguousarray(data, dtype=np.float32)
+        return self._rendered[key]
 
-            try:
-                read_data = self.current_sf.read(frames=frames, dtype='float32', always_2d=True)
 
-                if read_data.shape[0] == 0: 
-                    outdata[:] = 0 
-                    self.stream_finished_event.set() 
-                    raise sd.CallbackStop("End of track reached.")
+class HTTPStreamReader:
+    """
+    Read-only file-like object over a streaming HTTP response, for soundfile.
+    A download thread appends chunks to a sliding window, read() blocks until
+    the decoder's bytes have arrived. The window is capped at MAX_COMPRESSED_BYTES
+    ahead of the read position, so memory does not grow with the track length.
+    Reads far outside the window (e.g. an ID3 probe at the end of the file)
+    are served with a separate Range request.
+    If a sink (e.g. a cache writer) is given, every downloaded chunk is also written to it
+    and it is committed once the whole file has arrived.
+    prefix holds bytes that are already in memory, the response then only has to deliver
+    the rest (a Range request starting at len(prefix)).
+    suspend() drops the connection while the player does not need more data,
+    resume() continues the download with a Range request from where it stopped.
+    The same happens if the connection breaks. All requests go through a shared Transport.
+    """
+    def __init__(self, response, max_buffered=MAX_COMPRESSED_BYTES, keep_behind=KEEP_BEHIND_BYTES, chunk_size=CHUNK_SIZE, sink=None, prefix=b'', transport=None):
+        self.response = response
+        self.transport = transport if transport is not None else get_transport()
+        self.sink = sink
+        self.downloaded = 0
+        self.url = response.url
+        self.max_buffered = max_buffered
+        self.keep_behind = keep_behind
+        self.chunk_size = chunk_size
+        self.length = self._total_length(response, len(prefix))
+        # A server that ignores the Range header sends the prefix again
+        self._skip = len(prefix) if prefix and response.status_code == 200 else 0
+
+        self._buffer = bytearray(prefix)
+        if self.sink and prefix:
+            self.sink.write(prefix)
+        self._base = 0 # Absolute offset of _buffer[0]
+        self._pos = 0
+        self._window_pos = 0 # Last read position inside the window, far reads do not move it
+        self._eof = False
+        self._closed = False
+        self._suspended = False
+        self._error = None
+        self._sink_finished = False # Committed or discarded
+        self._cond = threading.Condition()
+
+        self._thread = threading.Thread(target=self._download, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _total_length(response, offset):
+        if response.status_code == 206:
+            # Content-Range: bytes <start>-<end>/<total>
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            return int(total) if total.isdigit() else None
+        content_length = response.headers.get('Content-Length')
+        return int(content_length) if content_length else None
+
+    @property
+    def _end(self):
+        return self._base + len(self._buffer)
+
+    def _reconnect(self):
+        """New response for the rest of the file, from the first byte not received yet"""
+        with self._cond:
+            offset = self._end
+        response = self.transport.get(self.url, stream=True, byte_range=(offset, None))
+        response.raise_for_status()
+        self.response = response
+        # A server that ignores the Range header sends everything again
+        self._skip = offset if response.status_code == 200 else 0
+
+    def _download(self):
+        complete = False
+        reconnects = 0
+        try:
+            while True:
+                try:
+                    for chunk in self.transport.iter_content(self.response, self.chunk_size):
+                        if self._skip:
+                            skipped = min(self._skip, len(chunk))
+                            chunk = chunk[skipped:]
+                            self._skip -= skipped
+                            if not chunk:
+                                continue
+                        with self._cond:
+                            # Backpressure: wait for the decoder to catch up
+                            while not self._closed and not self._suspended and self._end - self._window_pos >= self.max_buffered:
+                                self._cond.wait()
+                            if self._closed or self._suspended:
+                                return
+                            self._buffer.extend(chunk)
+                            self._trim()
+                            self._cond.notify_all()
+                        self.downloaded += len(chunk)
+                        if self.sink:
+                            self.sink.write(chunk)
+                    break
+                except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                    # The connection broke mid-track, continue with a Range request
+                    if self._closed or self._suspended or self.length is None or reconnects >= self.transport.max_retries:
+                        raise
+                    delay = self.transport.backoff(reconnects)
+                    reconnects += 1
+                    print(f"Download interrupted ({e}), resuming at byte {self._end} in {delay:.2f}s", flush=True)
+                    time.sleep(delay)
+                    self._reconnect()
+            # Closing the response on suspend() can also end the iteration early
+            complete = not self._closed and (not self._suspended or self._end == self.length)
+        except Exception as e:
+            if not self._suspended:
+                with self._cond:
+                    self._error = e
+        finally:
+            if self._suspended and not self._closed and not complete:
+                return # resume() continues the download
+            with self._cond:
+                self._eof = True
+                self._cond.notify_all()
+            self._finish_sink(complete)
+
+    def _finish_sink(self, complete):
+        """Commits or discards the cache file, only the first call does anything"""
+        with self._cond:
+            if self.sink is None or self._sink_finished:
+                return
+            self._sink_finished = True
+        try:
+            if complete:
+                self.sink.commit(self.length)
+            else:
+                self.sink.discard()
+        except Exception as e:
+            print(f"Error writing track to cache: {e}", flush=True)
+
+    def _trim(self):
+        drop = self._window_pos - self.keep_behind - self._base
+        if drop > 0:
+            del self._buffer[:drop]
+            self._base += drop
+
+    def _read_range(self, start, size):
+        """Fetch bytes outside the window with a Range request"""
+        if size <= 0:
+            return b''
+        try:
+            with self.transport.get(self.url, byte_range=(start, start + size - 1)) as response:
+                if response.status_code != 206:
+                    return b''
+                return response.content[:size]
+        except requests.exceptions.RequestException as e:
+            print(f"Range request failed: {e}", flush=True)
+            return b''
+
+    def __len__(self):
+        if self.length is None:
+            raise TypeError("Stream length unknown")
+        return self.length
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        with self._cond:
+            if whence == io.SEEK_CUR:
+                offset += self._pos
+            elif whence == io.SEEK_END:
+                if self.length is None:
+                    raise OSError("Cannot seek from end of a stream with unknown length")
+                offset += self.length
+            self._pos = max(0, offset)
+            self._cond.notify_all()
+            return self._pos
+
+    def read(self, size=-1):
+        with self._cond:
+            if size is None or size < 0:
+                size = (self.length or self._end) - self._pos
+            pos = self._pos
+            if self.length is not None and pos >= self.length:
+                return b''
+            far_behind = pos < self._base
+            far_ahead = pos > self._end + self.max_buffered
+            if not (far_behind or far_ahead):
+                while not self._closed and not self._eof and self._end <= pos:
+                    self._cond.wait()
+                if self._closed:
+                    return b''
+                if self._end > pos:
+                    offset = pos - self._base
+                    data = bytes(self._buffer[offset:offset + size])
+                    self._pos += len(data)
+                    self._window_pos = self._pos
+                    self._trim()
+                    self._cond.notify_all()
+                    return data
+                if self._error:
+                    print(f"Download error: {self._error}", flush=True)
+                return b''
+        if self.length is not None:
+            size = min(size, self.length - pos)
+        data = self._read_range(pos, size)
+        with self._cond:
+            self._pos = pos + len(data)
+        return data
+
+    def suspend(self):
+        """Closes the connection, the window and the read position are kept"""
+        with self._cond:
+            if self._eof or self._closed:
+                return
+            self._suspended = True
+            self._cond.notify_all()
+        try:
+            self.response.close()
+        except Exception as e:
+            print(f"Error closing response: {e}", flush=True)
+        self._thread.join(timeout=2.0)
+
+    def resume(self):
+        """Continues a suspended download with a Range request from the last byte received"""
+        with self._cond:
+            if not self._suspended:
+                return
+            self._suspended = False
+            if self._eof or self._closed:
+                return
+        try:
+            self._reconnect()
+        except requests.exceptions.RequestException as e:
+            print(f"Could not resume download: {e}", flush=True)
+            with self._cond:
+                self._error = e
+                self._eof = True
+                self._cond.notify_all()
+            self._finish_sink(False)
+            return
+        self._thread = threading.Thread(target=self._download, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._buffer = bytearray()
+            self._cond.notify_all()
+        try:
+            self.response.close()
+        except Exception as e:
+            print(f"Error closing response: {e}", flush=True)
+        # A download that stopped on suspend() never reaches its cleanup, a running one discards it itself
+        if not self._thread.is_alive():
+            self._finish_sink(False)
+
+
+class RingBuffer:
+    """
+    Preallocated single-producer/single-consumer float32 ring buffer.
+    Only the decoder thread moves write_pos and only the audio callback moves read_pos,
+    so the reading side needs no lock and never blocks. The writer polls while full.
+    """
+    def __init__(self, capacity, channels):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self.data = np.zeros((self.capacity, channels), dtype=np.float32)
+        self.read_pos = 0
+        self.write_pos = 0
+        self.finished = False # Producer reached the end of the track
+        self.closed = False # Playback was aborted
+
+    @property
+    def available(self):
+        return self.write_pos - self.read_pos
+
+    @property
+    def drained(self):
+        return self.finished and self.available == 0
+
+    def write(self, frames, poll_interval=0.005):
+        """Copy frames in, waits while full. Returns False if the buffer was closed"""
+        written = 0
+        total = frames.shape[0]
+        while written < total:
+            if self.closed:
+                return False
+            space = self.capacity - self.available
+            if space == 0:
+                time.sleep(poll_interval)
+                continue
+            count = min(total - written, space)
+            start = self.write_pos % self.capacity
+            first = min(count, self.capacity - start)
+            self.data[start:start + first] = frames[written:written + first]
+            self.data[:count - first] = frames[written + first:written + count]
+            # Publish only after the data is in place
+            self.write_pos += count
+            written += count
+        return True
+
+    def read_into(self, out):
+        """Copy up to len(out) frames into out. Returns the number of frames copied"""
+        count = min(out.shape[0], self.write_pos - self.read_pos)
+        start = self.read_pos % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self.data[start:start + first]
+        out[first:count] = self.data[:count - first]
+        self.read_pos += count
+        return count
+
+    def peek_into(self, out, offset=0):
+        """Like read_into(), but starting offset frames ahead and without consuming anything"""
+        count = max(0, min(out.shape[0], self.write_pos - self.read_pos - offset))
+        start = (self.read_pos + offset) % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self.data[start:start + first]
+        out[first:count] = self.data[:count - first]
+        return count
+
+    def wait_for(self, frames, timeout=None, poll_interval=0.005):
+        """Wait until at least `frames` frames are buffered or the producer is done"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not (self.closed or self.finished or self.available >= frames):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+        return True
+
+    def finish(self):
+        self.finished = True
+
+    def close(self):
+        self.closed = True
+
+
+class StreamResampler:
+    """
+    Linear interpolation resampling of consecutive (frames, channels) blocks.
+    The last input frame of every block is kept, so there is no discontinuity at block borders.
+    """
+    def __init__(self, src_rate, dst_rate):
+        self.step = src_rate / dst_rate
+        self.pos = 0.0 # Position of the next output frame in input frames, relative to self.prev
+        self.prev = None
+
+    def process(self, block):
+        if self.step == 1.0 or block.shape[0] == 0:
+            return block
+        data = block if self.prev is None else np.concatenate((self.prev, block))
+        last = data.shape[0] - 1
+        positions = np.arange(self.pos, last, self.step)
+        index = positions.astype(np.int64)
+        frac = (positions - index).astype(np.float32).reshape(-1, 1)
+        out = data[index] * (1.0 - frac) + data[index + 1] * frac
+        self.pos = (positions[-1] + self.step if positions.shape[0] else self.pos) - last
+        self.prev = data[-1:]
+        return out.astype(np.float32, copy=False)
+
+
+class AudioSource:
+    """
+    One track prepared for the MixerEngine. A decoder thread reads the sound file, converts
+    it to the mixer's rate and channel count and is the producer of the source's RingBuffer,
+    the mixer's callback is the consumer. The source owns the file-like object it decodes from.
+    """
+    def __init__(self, name, sound_file, reader, samplerate, channels, buffer_seconds=BUFFER_SECONDS, blocksize=BLOCK_SIZE):
+        self.name = name
+        self.sound_file = sound_file
+        self.reader = reader
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.ring = RingBuffer(buffer_seconds * samplerate, channels)
+        self.resampler = StreamResampler(sound_file.samplerate, samplerate)
+        self.decoder_thread = None
+
+        # Only written by the mixer's callback
+        self.started = False
+        self.ended = False # Played to the end, faded out or dropped
+        self.frames_played = 0
+        self.cause_time = None # Capture time of the frame that triggered this (interrupt) source
+
+    def start(self):
+        self.decoder_thread = threading.Thread(target=self._decode_loop, daemon=True)
+        self.decoder_thread.start()
+        return self
+
+    def wait_preroll(self, seconds=PREROLL_SECONDS, timeout=10.0):
+        """Waits until some audio is decoded, so playback does not start with an underrun"""
+        return self.ring.wait_for(int(seconds * self.samplerate), timeout=timeout)
+
+    @property
+    def decoded(self):
+        """The rest of the track is in the ring buffer"""
+        return self.ring.finished
 
-                outdata[:read_data.shape[0]] = read_data
+    @property
+    def position(self):
+        """Seconds played so far"""
+        return self.frames_played / self.samplerate
 
-                if read_data.shape[0] < frames:
-                    outdata[read_data.shape[0]:] = 0
-                    self.stream_finished_event.set() 
-                    raise sd.CallbackStop("End of track reached with padding.")
+    def suspend(self):
+        """
+        Interrupted: the decoded audio and the read position stay where they are,
+        only the network connection is dropped until resume()
+        """
+        if isinstance(self.reader, HTTPStreamReader):
+            self.reader.suspend()
 
+    def resume(self):
+        if isinstance(self.reader, HTTPStreamReader):
+            self.reader.resume()
+
+    def _convert(self, block):
+        block = self.resampler.process(block)
+        if block.shape[1] != self.channels:
+            block = np.repeat(block.mean(axis=1, keepdims=True), self.channels, axis=1)
+        return block
+
+    def _decode_loop(self):
+        """Producer thread: decodes blocks of the track into the ring buffer"""
+        try:
+            while not self.ring.closed:
+                with metrics.timer('audio_decode_seconds'):
+                    block = self.sound_file.read(frames=self.blocksize, dtype='float32', always_2d=True)
+                    if block.shape[0] == 0:
+                        break
+                    block = self._convert(block)
+                if not self.ring.write(block):
+                    break
+        except Exception as e:
+            print(f"Error decoding track {self.name}: {e}", flush=True)
+        finally:
+            self.ring.finish()
+
+    def close(self):
+        """Stops the decoder and closes the sound file and the reader"""
+        self.ring.close()
+        if isinstance(self.reader, HTTPStreamReader):
+            self.reader.close() # Wakes up the decoder if it waits for data
+        if self.decoder_thread:
+            self.decoder_thread.join(timeout=2.0)
+            self.decoder_thread = None
+        for resource in (self.sound_file, self.reader):
+            try:
+                resource.close()
             except Exception as e:
-                print(f"Error during audio callback: {e}", flush=True)
-                outdata[:] = 0 
-                self.stream_finished_event.set()
-                raise sd.CallbackStop("Error reading audio data.")
+                print(f"Error closing {self.name}: {e}", flush=True)
+
+
+class MixerEngine:
+    """
+    One long-lived OutputStream at a fixed sample rate that every AudioSource is mixed into,
+    so changing tracks never reopens the audio device.
+    play() switches to a source right away and fades the current one out over `crossfade` seconds.
+    A source passed as `keep` is faded out without consuming its buffer, so it can be
+    played again later from exactly the frame where it was interrupted.
+    enqueue() makes a source the next one: it starts the moment the current one runs out
+    (gapless) or, with a crossfade, that many seconds before.
+    The callback only copies and scales preallocated buffers: commands from other threads are
+    single attribute assignments it picks up at the start of a block, no locks, no allocation.
+    Paused or starved callbacks output silence and are counted instead of printed.
+    Sources that ended are closed by a housekeeping thread.
+    An overlay clip (announcement) can be mixed on top, the music is ducked meanwhile.
+    """
+    def __init__(self, samplerate=MIXER_SAMPLERATE, channels=MIXER_CHANNELS, blocksize=BLOCK_SIZE, stream_class=None):
+        self.samplerate = samplerate
+        self.stream_class = stream_class # sd.OutputStream unless a stand-in device is given
+        self.channels = channels
+        self.blocksize = blocksize
+        self.paused = False
+
+        # Commands, written by other threads
+        self._command = None # (source, fade frames, source to keep) from play()
+        self._command_seq = 0
+        self._next = None # (source, fade frames) from enqueue()
+
+        # Playback state, only written by the callback
+        self._applied_seq = 0
+        self.current = None
+        self.outgoing = None # Previous source while it fades out
+        self.outgoing_kept = False # Outgoing source is faded out without consuming it
+        self.fade_pos = 0
+        self.fade_frames = 0
+
+        # Overlay, swapped in as one tuple so the callback never sees a half-set state
+        self.overlay = None # (clip, samples at the stream format)
+        self.overlay_pos = 0
+        self.gain = 1.0
+
+        # Preallocated work buffers for the callback
+        self._ramp = np.linspace(0.0, 1.0, blocksize, dtype=np.float32).reshape(-1, 1)
+        self._gain_block = np.empty((blocksize, 1), dtype=np.float32)
+        self._index = np.arange(blocksize, dtype=np.float32).reshape(-1, 1)
+        self._fade_in = np.empty((blocksize, 1), dtype=np.float32)
+        self._fade_out = np.empty((blocksize, 1), dtype=np.float32)
+        self._mix = np.empty((blocksize, channels), dtype=np.float32)
+
+        # Counters, only written by the audio callback
+        self.callbacks = 0
+        self.frames_played = 0
+        self.underruns = 0 # Callbacks the current source could not fill completely
+        self.underrun_frames = 0
+        self.device_status_errors = 0 # Over/underflows reported by PortAudio
+        self.underflows = 0
+        self.overflows = 0
+        self.transitions = 0
+        self.last_interrupt_latency = None # Seconds from the triggering frame to the interrupt's first sample
+        self.interrupts_started = 0
+        # Durations of the last callbacks, moved into the metrics by the housekeeping thread:
+        # the callback itself never takes the metrics' locks
+        self._callback_seconds = np.zeros(CALLBACK_TIMING_SLOTS)
+        self._callbacks_timed = 0
+        self._published = {'underflows': 0, 'overflows': 0, 'underruns': 0, 'interrupts_started': 0, 'callbacks_timed': 0}
+
+        self.output_latency = 0.0 # Seconds from the callback until the device plays a sample
+
+        self.sources = [] # Every source handed to the mixer that is not closed yet
+        self.sources_lock = threading.Lock()
+        self.stream = None
+        self.housekeeping_thread = None
+        self.closed = False
+
+    def start(self):
+        """Opens the output stream, once. Later calls do nothing"""
+        if self.stream is not None:
+            return
+        self.stream = (self.stream_class or sd.OutputStream)(
+            samplerate=self.samplerate,
+            channels=self.channels,
+            blocksize=self.blocksize,
+            dtype='float32',
+            callback=self._callback
+        )
+        self.stream.start()
+        self.output_latency = self.stream.latency
+        self.housekeeping_thread = threading.Thread(target=self._housekeeping_loop, daemon=True)
+        self.housekeeping_thread.start()
+
+    @property
+    def idle(self):
+        return self.current is None and self.outgoing is None and self._command_seq == self._applied_seq
+
+    def _track(self, source):
+        if source is not None:
+            source.started = False # A kept source is started again
+            with self.sources_lock:
+                if source not in self.sources:
+                    self.sources.append(source)
+
+    def _drop_next(self, keep=None, keep_queued=False):
+        queued = self._next
+        self._next = None
+        if queued is not None and not queued[0].started and queued[0] is not keep and not keep_queued:
+            queued[0].ended = True
+
+    def play(self, source, crossfade=0.0, keep=None, keep_queued=False):
+        """
+        Switches to source (None = silence) at the next block, a queued source is dropped.
+        If keep is the current source then, it is kept at its position instead of ending.
+        keep_queued only takes the queued source out of the queue, to enqueue() it again later.
+        """
+        self._track(source)
+        self._drop_next(keep, keep_queued)
+        self._command = (source, int(crossfade * self.samplerate), keep)
+        self._command_seq += 1
+
+    def enqueue(self, source, crossfade=0.0):
+        """Plays source after the current one, replaces a source queued before"""
+        self._track(source)
+        self._drop_next()
+        self._next = (source, int(crossfade * self.samplerate))
 
-    def _close_stream_resources(self):
+    def stop(self, fade=FADE_OUT_SECONDS):
+        self.play(None, fade)
+
+    def _callback(self, outdata, frames, time_info, status):
+        started = time.perf_counter() if metrics.enabled else None
+        self.callbacks += 1
+        if status:
+            self.device_status_errors += 1
+            if status.output_underflow:
+                self.underflows += 1
+            if status.output_overflow:
+                self.overflows += 1
+
+        seq = self._command_seq
+        if seq != self._applied_seq:
+            self._applied_seq = seq
+            self._switch(*self._command)
+
+        outdata.fill(0)
+        if not self.paused:
+            self._mix_sources(outdata, frames)
+        self._mix_overlay(outdata, frames)
+        if started is not None:
+            self._callback_seconds[self._callbacks_timed % CALLBACK_TIMING_SLOTS] = time.perf_counter() - started
+            self._callbacks_timed += 1
+
+    def _switch(self, source, fade_frames, keep=None):
+        """Makes source the current one, the previous one fades out over fade_frames"""
+        if source is not None and source is self.current:
+            return
+        outgoing = self.outgoing
+        if outgoing is not None and outgoing is not source and not self.outgoing_kept:
+            outgoing.ended = True # A fade still running is cut short
+        self.outgoing = None
+        previous = self.current
+        if previous is not None:
+            if fade_frames > 0:
+                self.outgoing = previous
+                self.outgoing_kept = previous is keep
+            elif previous is not keep:
+                previous.ended = True
+        self.fade_pos = 0
+        self.fade_frames = fade_frames
+        self.current = source
+        if source is not None:
+            source.started = True
+            self.transitions += 1
+
+    def _queued(self):
+        queued = self._next
+        if queued is None or queued[0].started or queued[0].ended:
+            return None
+        return queued
+
+    def _fade_gains(self, frames):
+        fade_in = self._fade_in[:frames]
+        np.add(self._index[:frames], self.fade_pos, out=fade_in)
+        fade_in /= self.fade_frames
+        np.clip(fade_in, 0.0, 1.0, out=fade_in)
+        fade_out = self._fade_out[:frames]
+        np.subtract(1.0, fade_in, out=fade_out)
+        return fade_in, fade_out
+
+    def _add_source(self, source, outdata, frames, gain=None, consume=True):
+        """Adds up to frames frames of source to outdata, returns how many there were"""
+        mix = self._mix[:frames]
+        if consume:
+            copied = source.ring.read_into(mix)
+            source.frames_played += copied
+            if copied and source.cause_time is not None:
+                # First sample of an interrupt, the device plays it output_latency from now
+                self.last_interrupt_latency = time.time() - source.cause_time + self.output_latency
+                self.interrupts_started += 1
+                source.cause_time = None
+        else:
+            copied = source.ring.peek_into(mix, self.fade_pos)
+        if copied:
+            if gain is not None:
+                mix[:copied] *= gain[:copied]
+            outdata[:copied] += mix[:copied]
+        return copied
+
+    def _mix_sources(self, outdata, frames):
+        current = self.current
+        queued = self._queued()
+        if queued is not None:
+            if current is None:
+                self._switch(queued[0], 0)
+            elif queued[1] > 0 and current.ring.finished and 0 < current.ring.available <= queued[1]:
+                # Crossfade into the queued source, timed to end when the current one does
+                self._switch(queued[0], current.ring.available)
+            current = self.current
+
+        fade_in = fade_out = None
+        outgoing = self.outgoing
+        if outgoing is not None:
+            fade_in, fade_out = self._fade_gains(frames)
+            copied = self._add_source(outgoing, outdata, frames, fade_out, consume=not self.outgoing_kept)
+            self.fade_pos += frames
+            if self.fade_pos >= self.fade_frames or (copied < frames and outgoing.ring.finished):
+                if not self.outgoing_kept:
+                    outgoing.ended = True
+                self.outgoing = None
+
+        if current is None:
+            return
+        copied = self._add_source(current, outdata, frames, fade_in)
+        if copied < frames:
+            if current.ring.drained:
+                current.ended = True
+                self.current = None
+                queued = self._queued()
+                if queued is not None:
+                    # Gapless: the next source continues in the same block
+                    self._switch(queued[0], 0)
+                    copied += self._add_source(queued[0], outdata[copied:], frames - copied)
+            else:
+                # The decoder fell behind, play silence until it catches up
+                self.underruns += 1
+                self.underrun_frames += frames - copied
+        self.frames_played += copied
+
+    def _mix_overlay(self, outdata, frames):
+        """Ducks the music towards DUCK_GAIN while an overlay plays and adds the overlay"""
+        overlay = self.overlay
+        target = DUCK_GAIN if overlay is not None else 1.0
+        if self.gain != target or target != 1.0:
+            if self.gain != target and frames <= self._ramp.shape[0]:
+                # Ramp over the block to avoid clicks
+                gain_block = self._gain_block[:frames]
+                np.multiply(self._ramp[:frames], target - self.gain, out=gain_block)
+                gain_block += self.gain
+                outdata *= gain_block
+            else:
+                outdata *= target
+            self.gain = target
+        if overlay is None:
+            return
+        samples = overlay[1]
+        pos = self.overlay_pos
+        count = min(frames, samples.shape[0] - pos)
+        outdata[:count] += samples[pos:pos + count]
+        self.overlay_pos = pos + count
+        if self.overlay_pos >= samples.shape[0]:
+            self.overlay = None
+
+    def play_overlay(self, clip):
+        """Mixes clip on top of the music from any thread"""
+        samples = clip.render(self.samplerate, self.channels)
+        self.overlay = None
+        self.overlay_pos = 0
+        self.overlay = (clip, samples)
+
+    def _close_ended(self, close_all=False):
+        with self.sources_lock:
+            ended = [source for source in self.sources if close_all or source.ended]
+            self.sources = [source for source in self.sources if source not in ended]
+        for source in ended:
+            source.close()
+
+    def _publish_metrics(self):
+        """Moves what the callback counted since the last call into the metrics, off the audio thread"""
+        published = self._published
+        for name, counter in (('underflows', 'audio_underflows_total'), ('overflows', 'audio_overflows_total'), ('underruns', 'audio_decoder_underruns_total')):
+            value = getattr(self, name)
+            if value != published[name]:
+                metrics.inc(counter, value - published[name])
+                published[name] = value
+        interrupts = self.interrupts_started
+        if interrupts != published['interrupts_started']:
+            # Only the latest one if several started since the last call, they are seconds apart
+            metrics.observe('expression_to_interrupt_seconds', self.last_interrupt_latency)
+            published['interrupts_started'] = interrupts
+        timed = self._callbacks_timed
+        # Durations the ring already overwrote are lost, at 0.1s per call that never happens
+        for i in range(max(published['callbacks_timed'], timed - CALLBACK_TIMING_SLOTS), timed):
+            metrics.observe('audio_callback_seconds', float(self._callback_seconds[i % CALLBACK_TIMING_SLOTS]))
+        published['callbacks_timed'] = timed
+
+    def _housekeeping_loop(self):
+        while not self.closed:
+            time.sleep(0.1)
+            self._close_ended()
+            self._publish_metrics()
+
+    def close(self):
+        """Stops the device and closes all sources, the mixer cannot be started again"""
+        self.closed = True
         if self.stream:
             try:
-                if not self.stream.closed:
-                    self.stream.stop()
-                    self.stream.close()
+                self.stream.stop()
+                self.stream.close()
             except Exception as e:
                 print(f"Error closing stream: {e}", flush=True)
-            self.stream = None
-        if self.current_sf:
-            try:
-                self.current_sf.close()
-            except Exception as e:
-                print(f"Error closing soundfile: {e}", flush=True)
-            self.current_sf = None
-        if self.current_response:
-            try:
-                self.current_response.close() 
-            except Exception as e:
-                print(f"Error closing response: {e}", flush=True)
-            self.current_response = None
+        self._close_ended(close_all=True)
+        self._publish_metrics()
 
+    def stats(self):
+        current = self.current
+        return {
+            'callbacks': self.callbacks,
+            'frames_played': self.frames_played,
+            'underruns': self.underruns,
+            'underrun_frames': self.underrun_frames,
+            'device_status_errors': self.device_status_errors,
+            'transitions': self.transitions,
+            'last_interrupt_latency': round(self.last_interrupt_latency, 3) if self.last_interrupt_latency is not None else None,
+            'sources': len(self.sources),
+            'current': current.name if current is not None else None,
+            'buffered_frames': current.ring.available if current is not None else 0,
+        }
 
-    def _play_track_streaming(self, track):
-        try:
-            stream_url = track.get_stream_url()
-            if not stream_url:
-                print(f"Stream URL not found for {track.title}.", flush=True)
-                return False # Indicate failure
 
-            print(f"Streaming: {track.title}", flush=True)
-            self.current_response = requests.get(stream_url, stream=True)
-            self.current_response.raise_for_status()
-            
-            file_like_object = io.BytesIO(self.current_response.content)
-            file_like_object.seek(0)
+def stream_url_of(api, track):
+    """Stream URL through the API's transport if it has one, else through sclib's urllib call"""
+    if hasattr(api, 'get_stream_url'):
+        return api.get_stream_url(track)
+    return track.get_stream_url()
 
-            self.current_sf = sf.SoundFile(file_like_object)
 
-            self.stream_finished_event.clear()
-            
-            self.stream = sd.OutputStream(
-                samplerate=self.current_sf.samplerate,
-                channels=self.current_sf.channels,
-                blocksize=BLOCK_SIZE, 
-                callback=self._audio_callback,
-                finished_callback=self.stream_finished_event.set 
-            )
-            self.stream.start()
-            return True 
+class InterruptTrack:
+    """
+    A registered interrupt track: resolved once at startup, with its stream URL
+    and the first WARM_BYTES of the file kept in memory.
+    """
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.track = None
+        self.stream_url = None
+        self.stream_url_time = 0.0
+        self.head = b''
+        self.complete = False # head holds the whole file
+
+    @property
+    def ready(self):
+        return self.track is not None
+
+    def stream_url_fresh(self):
+        return self.stream_url is not None and time.time() - self.stream_url_time < STREAM_URL_TTL
+
+    def refresh_stream_url(self, api):
+        self.stream_url = stream_url_of(api, self.track)
+        self.stream_url_time = time.time()
+
+    def fetch_head(self, transport, size=WARM_BYTES):
+        with transport.get(self.stream_url, stream=True, byte_range=(0, size - 1)) as response:
+            response.raise_for_status()
+            head = bytearray()
+            for chunk in transport.iter_content(response, CHUNK_SIZE):
+                head.extend(chunk)
+                if len(head) >= size:
+                    break
+            total = HTTPStreamReader._total_length(response, 0)
+        self.head = bytes(head[:size])
+        self.complete = total is not None and total <= len(self.head)
+
+
+class SoundCloudPlayer:
+    def __init__(self, preroll_seconds=PREROLL_SECONDS, buffer_seconds=BUFFER_SECONDS, api=None, cache=None, interrupt_tracks=None,
+                 crossfade_seconds=CROSSFADE_SECONDS, playlist_crossfade_seconds=PLAYLIST_CROSSFADE_SECONDS, samplerate=MIXER_SAMPLERATE, mixer=None,
+                 on_track=None):
+        """
+        api: defaults to func_lib.transport.SoundcloudAPI(), func_lib.cache.LocalDirectoryAPI works offline
+        cache: optional func_lib.cache.TrackCache, tracks are then only downloaded once
+        interrupt_tracks: {name: soundcloud url}, see preload_interrupts()
+        crossfade_seconds: fade into and out of interrupt tracks
+        playlist_crossfade_seconds: fade between two playlist tracks, 0 plays them gapless
+        mixer: a MixerEngine to play into, e.g. one on a stand-in audio device
+        on_track: called with (track, playlist index or None for an interrupt) when a track starts
+        """
+        self.preroll_seconds = preroll_seconds
+        self.buffer_seconds = buffer_seconds
+        self.crossfade_seconds = crossfade_seconds
+        self.playlist_crossfade_seconds = playlist_crossfade_seconds
+        self.transport = getattr(api, 'transport', None) or get_transport()
+        self.api = api if api is not None else SoundcloudAPI(transport=self.transport)
+        self.cache = cache
+        self.playlist = None
+        self.current_track_index = 0
+        self.is_playing = False      
+        self.is_paused = False       
+        self.is_interrupted = False  
+        self.stop_requested = False  
+        self.interrupt_track_url = None
+        self.interrupt_cause_time = None
+        self.on_track = on_track
+
+        self.lock = threading.Lock() 
+
+        # One output stream for the whole session, opened by start_playlist()
+        self.mixer = mixer if mixer is not None else MixerEngine(samplerate=samplerate)
+        self.stream_thread = None    
+
+        self.interrupt_tracks = {name: InterruptTrack(name, url) for name, url in (interrupt_tracks or {}).items()}
+        self.refresh_thread = None
+
+    def _open_track_source(self, track):
+        """Returns a file-like object for the track: cache hit, local file or HTTP stream"""
+        track_id = getattr(track, 'id', None)
+        if self.cache and self.cache.contains(track_id):
+            cached = self.cache.open(track_id)
+            if cached:
+                print(f"Playing from cache: {track.title}", flush=True)
+                return cached
+
+        local_path = getattr(track, 'path', None)
+        if local_path:
+            print(f"Playing local file: {track.title}", flush=True)
+            return MappedFile(local_path)
+
+        warm = self._warm_interrupt_for(track_id)
+        if warm and warm.complete:
+            print(f"Playing from memory: {track.title}", flush=True)
+            return io.BytesIO(warm.head)
+
+        if warm and warm.stream_url_fresh():
+            stream_url = warm.stream_url
+        else:
+            stream_url = stream_url_of(self.api, track)
+        if not stream_url:
+            return None
+
+        print(f"Streaming: {track.title}", flush=True)
+        prefix = warm.head if warm else b''
+        # Only the part after the in-memory head has to be downloaded
+        response = self.transport.get(stream_url, stream=True, byte_range=(len(prefix), None) if prefix else None)
+        response.raise_for_status()
+
+        sink = self.cache.writer(track_id, track.title) if self.cache and track_id is not None else None
+        # The decoder reads from the download while it is still running
+        return HTTPStreamReader(response, sink=sink, prefix=prefix, transport=self.transport)
+
+    def _open_source(self, track):
+        """Starts decoding a track for the mixer, returns the AudioSource or None on failure"""
+        reader = None
+        try:
+            reader = self._open_track_source(track)
+            if not reader:
+                print(f"Stream URL not found for {track.title}.", flush=True)
+                return None
+            sound_file = sf.SoundFile(reader)
+            source = AudioSource(track.title, sound_file, reader, self.mixer.samplerate, self.mixer.channels, buffer_seconds=self.buffer_seconds)
+            return source.start()
 
         except requests.exceptions.RequestException as e:
             print(f"Network error fetching track {track.title}: {e}", flush=True)
         except sf.SoundFileError as e:
              print(f"Error opening soundfile for {track.title}: {e}", flush=True)
-        except sd.PortAudioError as e:
-             print(f"Sound device error for {track.title}: {e}", flush=True)
         except Exception as e:
             print(f"Error preparing track {track.title}: {e}", flush=True)
 
-        self._close_stream_resources() 
-        self.stream_finished_event.set()
-        return False 
+        if reader:
+            try:
+                reader.close()
+            except Exception as e:
+                print(f"Error closing track source: {e}", flush=True)
+        return None
+
+    def _wait_for(self, source, decoded=False, successor=None):
+        """
+        Waits until source has ended, or with decoded=True until it plays and is decoded to the end
+        (the moment to prepare the next one). Also returns once the mixer started successor,
+        source may still be fading out then. Returns early on an interrupt or stop.
+        """
+        while not (self.is_interrupted or self.stop_requested or source.ended or (decoded and source.started and source.decoded)
+                   or (successor is not None and successor.started)):
+            time.sleep(POLL_INTERVAL)
+
+    def _play_playlist_loop(self, playlist_url=None):
+        """
+        The main loop running in a separate thread. Playback itself happens in the mixer:
+        this loop opens the sources, queues the next one while the current one plays and
+        switches to interrupt tracks. The playlist track an interrupt cuts off is kept with its
+        decoded audio and continues at the same frame afterwards.
+        """
+        preloaded = None # (playlist index, source) already queued in the mixer
+        playing = None # (playlist index, source) handed to the mixer last
+        suspended = None # (playlist index, source) cut off by an interrupt
+        following = None # (playlist index, source) that was queued after the suspended one
+        announced = None # Playlist index last announced, a track resumed after an interrupt is not announced again
+        if playlist_url is not None and not self._load_playlist(playlist_url):
+            with self.lock:
+                self.is_playing = False
+            return
 
-    def _play_playlist_loop(self):
-        """The main loop running in a separate thread."""
         while True:
-            current_track_object = None
-            play_this_track = False
+            track = None
+            index = None
+            url_to_play = None
+            cause_time = None
 
             with self.lock:
                 if self.stop_requested:
@@ -153,97 +1048,282 @@ class SoundCloudPlayer:
 
                 if self.is_interrupted:
                     url_to_play = self.interrupt_track_url
+                    cause_time = self.interrupt_cause_time
                     self.interrupt_track_url = None 
                     self.is_interrupted = False 
 
-                    try:
-                        current_track_object = self.api.resolve(url_to_play)
-                        play_this_track = True
-                        print(f"--- Interrupting with: {current_track_object.title} ---", flush=True)
-                    except Exception as e:
-                        print(f"Error resolving interrupt track {url_to_play}: {e}", flush=True)
-                        continue # Skip to next iteration
-
-                elif self.playlist is None or self.current_track_index >= len(self.playlist.tracks):
+                elif self.playlist is None or self.current_track_index >= len(self.playlist):
                     self.is_playing = False
                     break 
 
-
                 else:
-                    current_track_object = self.playlist.tracks[self.current_track_index]
-                    play_this_track = True
-                    print(f"\nNow playing: {current_track_object.title} ({self.current_track_index + 1}/{len(self.playlist.tracks)})", flush=True)
+                    index = self.current_track_index
 
-            if play_this_track and current_track_object:
-                started_ok = self._play_track_streaming(current_track_object)
+            if index is not None:
+                # The metadata may still be on its way, interrupts and stop are checked meanwhile
+                if not self.playlist.wait(index, timeout=0.5):
+                    continue
+                track = self.playlist.get(index)
+                if track is None:
+                    print(f"Skipping unavailable track {index + 1}.", flush=True)
+                    with self.lock:
+                        if self.current_track_index == index:
+                            self.current_track_index += 1
+                    continue
+                if index != announced:
+                    print(f"\nNow playing: {track.title} ({index + 1}/{len(self.playlist)})", flush=True)
+                    self._notify_track(track, index)
+                    announced = index
 
-                if started_ok:
-                    self.stream_finished_event.wait()
-                    
+            if url_to_play:
+                # Resolving may talk to SoundCloud, so it must not hold the lock
+                try:
+                    track = self._resolve_interrupt(url_to_play)
+                    print(f"--- Interrupting with: {track.title} ---", flush=True)
+                    self._notify_track(track, None)
+                except Exception as e:
+                    print(f"Error resolving interrupt track {url_to_play}: {e}", flush=True)
+                    continue # Skip to next iteration
+                source = self._open_source(track)
+                if source is None:
+                    print(f"Skipping interrupt track {track.title} due to error.", flush=True)
+                    continue
+                source.cause_time = cause_time
+                source.wait_preroll(self.preroll_seconds)
+                if suspended is None or suspended[1].ended:
+                    suspended = next((entry for entry in (preloaded, playing) if entry and entry[1].started and not entry[1].ended), None)
+                keep = suspended[1] if suspended else None
+                if preloaded and preloaded[1] is not keep and not preloaded[1].started and not preloaded[1].ended:
+                    following = preloaded # Continues after the interrupted track, without a new download
+                # The playlist track fades out under the interrupt, the queued one waits for its turn
+                self.mixer.play(source, crossfade=self.crossfade_seconds, keep=keep, keep_queued=following is not None)
+                for waiting in (keep, following[1] if following else None):
+                    if waiting:
+                        waiting.suspend()
+                preloaded = None
+            elif preloaded and preloaded[0] == index:
+                source = preloaded[1] # Already queued, the mixer starts it without a gap
+                preloaded = None
+                if suspended and suspended[1] is source:
+                    suspended = None
+                playing = (index, source)
+            else:
+                source = self._open_source(track)
+                if source is None:
+                    print(f"Skipping track {track.title} due to error.", flush=True)
                     with self.lock:
-                        self._close_stream_resources()
-                        
-                        if not self.is_interrupted and not self.stop_requested and current_track_object == self.playlist.tracks[self.current_track_index]:
-                             self.current_track_index += 1
+                        if self.current_track_index == index:
+                            self.current_track_index += 1
+                    continue
+                source.wait_preroll(self.preroll_seconds)
+                self.mixer.enqueue(source)
+                playing = (index, source)
+
+            # Preload what comes next while the end of this source is still playing
+            self._wait_for(source, decoded=True)
+            if not (self.is_interrupted or self.stop_requested or source.ended):
+                with self.lock:
+                    next_index = index + 1 if index is not None else self.current_track_index
+                # Only preloads if the worker already has the metadata, waiting here would delay interrupts
+                next_track = self.playlist.get(next_index) if next_index < len(self.playlist) and self.playlist.wait(next_index, timeout=0) else None
+                if index is None and suspended and suspended[0] == next_index and not suspended[1].ended:
+                    # Back to the interrupted track, from its buffer and without a new download
+                    next_source = suspended[1]
+                    next_source.resume()
+                    print(f"Resuming {next_source.name} at {next_source.position:.1f}s", flush=True)
+                elif following and following[0] == next_index and not following[1].ended:
+                    next_source = following[1]
+                    next_source.resume()
+                    following = None
+                elif next_track is not None:
+                    next_source = self._open_source(next_track)
                 else:
-                    
-                    print(f"Skipping track {current_track_object.title} due to error.", flush=True)
-                    with self.lock:
-                         if current_track_object == self.playlist.tracks[self.current_track_index]:
-                            self.current_track_index += 1 
+                    next_source = None
+                if next_source is not None:
+                    # Back from an interrupt fades, within the playlist it is gapless by default
+                    crossfade = self.playlist_crossfade_seconds if index is not None else self.crossfade_seconds
+                    self.mixer.enqueue(next_source, crossfade=crossfade)
+                    preloaded = (next_index, next_source)
 
-            time.sleep(0.1)
+            # A short successor (e.g. the rest of an interrupted track) can even end while this one
+            # still fades out, the loop has to move on as soon as it starts to queue the one after it
+            successor = preloaded[1] if preloaded else None
+            self._wait_for(source, successor=successor)
+            if (source.ended or (successor is not None and successor.started)) and index is not None:
+                with self.lock:
+                    if self.current_track_index == index:
+                        self.current_track_index += 1
 
+        for waiting in (suspended, following):
+            if waiting:
+                waiting[1].ended = True # Closed by the mixer
+        if self.playlist is not None:
+            self.playlist.close()
+        self.mixer.stop()
 
-        with self.lock:
-            self.is_playing = False
-            self._close_stream_resources()
 
+    def _notify_track(self, track, index):
+        if self.on_track is None:
+            return
+        try:
+            self.on_track(track, index)
+        except Exception as e:
+            print(f"Error in track callback: {e}", flush=True)
+
+    def _load_playlist(self, playlist_url):
+        """Resolves the set with one request, the track metadata follows in the background"""
+        try:
+            print("Resolving playlist...", flush=True)
+            playlist = resolve_playlist(self.api, playlist_url)
+        except Exception as e:
+            print(f"Error resolving playlist {playlist_url}: {e}", flush=True)
+            return False
+        if playlist is None:
+            print("Resolved URL is not a playlist.", flush=True)
+            return False
+        if not len(playlist):
+            print("Playlist is empty.", flush=True)
+            playlist.close()
+            return False
+        print(f"Playlist '{playlist.title}' has {len(playlist)} tracks, loading them while playing.", flush=True)
+        with self.lock:
+            self.playlist = playlist
+        return True
 
     def start_playlist(self, playlist_url):
+        """Returns right away, the playlist is resolved and played on the player's thread"""
         with self.lock:
             if self.is_playing:
                 print("Player is already playing. Stop first.", flush=True)
                 return
 
             try:
-                print("Resolving playlist...", flush=True)
-                self.playlist = self.api.resolve(playlist_url)
-                if not isinstance(self.playlist, sclib.Playlist):
-                     print(f"Resolved URL is not a playlist ({type(self.playlist)}).", flush=True)
-                     self.playlist = None
-                     return
-                if not self.playlist.tracks:
-                    print("Playlist is empty.", flush=True)
-                    self.playlist = None
-                    return
-                print(f"Playlist '{self.playlist.title}' loaded with {len(self.playlist.tracks)} tracks.", flush=True)
+                self.mixer.start()
             except Exception as e:
-                print(f"Error resolving playlist {playlist_url}: {e}", flush=True)
-                self.playlist = None
+                print(f"Error opening the audio device: {e}", flush=True)
                 return
 
+            if self.playlist is not None:
+                self.playlist.close()
+            self.playlist = None
             self.current_track_index = 0
             self.is_playing = True
             self.stop_requested = False
             self.is_interrupted = False
             self.is_paused = False
-            self.pause_event.set() 
+            self.mixer.paused = False
             
-            self.stream_thread = threading.Thread(target=self._play_playlist_loop, daemon=True)
+            self.stream_thread = threading.Thread(target=self._play_playlist_loop, args=(playlist_url,), daemon=True)
             self.stream_thread.start()
 
-    def interrupt(self, track_url):
+    def playlist_progress(self):
+        """How much of the playlist's metadata is loaded, None before it is resolved"""
+        playlist = self.playlist
+        return playlist.progress() if playlist is not None else None
+
+    def _find_interrupt(self, key):
+        """Registered interrupt track by name or URL"""
+        entry = self.interrupt_tracks.get(key)
+        if entry is None:
+            entry = next((e for e in self.interrupt_tracks.values() if e.url == key), None)
+        return entry
+
+    def _warm_interrupt_for(self, track_id):
+        if track_id is None:
+            return None
+        return next((e for e in self.interrupt_tracks.values() if e.track is not None and e.track.id == track_id), None)
+
+    def _resolve_interrupt(self, key):
+        """Track object for an interrupt name or URL, preloaded ones need no network at all"""
+        entry = self._find_interrupt(key)
+        if entry and entry.track:
+            return entry.track
+        url = entry.url if entry else key
+        # A cached interrupt track needs no resolve and no download
+        track = self.cache.lookup_url(url) if self.cache else None
+        if track is None:
+            with metrics.timer('soundcloud_resolve_seconds'):
+                track = self.api.resolve(url)
+            if self.cache:
+                self.cache.remember_url(url, track)
+        if entry:
+            entry.track = track
+        return track
+
+    def _warm_interrupt(self, entry):
+        try:
+            self._resolve_interrupt(entry.name)
+            if getattr(entry.track, 'path', None) or (self.cache and self.cache.contains(entry.track.id)):
+                return # Local or already on disk, nothing to keep in memory
+            entry.refresh_stream_url(self.api)
+            if not entry.head:
+                entry.fetch_head(self.transport)
+                if entry.complete and self.cache:
+                    self.cache.store(entry.track.id, entry.track.title, entry.head)
+        except Exception as e:
+            print(f"Error preloading interrupt track {entry.name} ({entry.url}): {e}", flush=True)
+
+    def _refresh_interrupts_loop(self):
+        """Keeps the stream URLs of the interrupt tracks from expiring"""
+        while True:
+            time.sleep(STREAM_URL_TTL / 2)
+            for entry in list(self.interrupt_tracks.values()):
+                if entry.stream_url is None:
+                    self._warm_interrupt(entry) # Failed at startup, try again
+                    continue
+                try:
+                    entry.refresh_stream_url(self.api)
+                except Exception as e:
+                    print(f"Error refreshing stream URL of {entry.name}: {e}", flush=True)
+
+    def add_interrupt_tracks(self, tracks, wait=False):
+        """Registers new or changed interrupt tracks ({name: url}) and preloads them"""
+        for name, url in tracks.items():
+            entry = self.interrupt_tracks.get(name)
+            if entry is None or entry.url != url:
+                self.interrupt_tracks[name] = InterruptTrack(name, url)
+        self.preload_interrupts(wait=wait)
+
+    def preload_interrupts(self, wait=True, max_workers=8):
+        """
+        Resolves all registered interrupt tracks concurrently and keeps their track
+        objects, stream URLs and the start of their audio in memory, so an interrupt
+        does not wait for SoundCloud. Stream URLs are refreshed in the background.
+        """
+        entries = list(self.interrupt_tracks.values())
+        if not entries:
+            return
+
+        def warm_all():
+            start = time.time()
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(entries))) as pool:
+                list(pool.map(self._warm_interrupt, entries))
+            ready = sum(entry.ready for entry in entries)
+            print(f"{ready}/{len(entries)} interrupt tracks ready in {time.time() - start:.2f}s.", flush=True)
+
+        if wait:
+            warm_all()
+        else:
+            threading.Thread(target=warm_all, daemon=True).start()
+
+        if self.refresh_thread is None:
+            self.refresh_thread = threading.Thread(target=self._refresh_interrupts_loop, daemon=True)
+            self.refresh_thread.start()
+
+    def interrupt(self, track_url, cause_time=None):
+        """
+        track_url: a SoundCloud URL or the name of a registered interrupt track.
+        cause_time: time.time() of the camera frame that led to it, for the end-to-end latency
+        """
         with self.lock:
             if not self.is_playing:
                 print("Cannot interrupt: Player is not playing.", flush=True)
                 return
 
             print("Interrupt requested.", flush=True)
-            self.is_interrupted = True
+            self.is_interrupted = True # The playlist loop crossfades to the interrupt track
             self.interrupt_track_url = track_url
-            if self.stream and not self.stream.stopped:
-                 pass 
+            self.interrupt_cause_time = cause_time
 
     def stop(self):
         with self.lock:
@@ -253,8 +1333,7 @@ class SoundCloudPlayer:
             self.stop_requested = True 
             self.is_playing = False 
             self.is_paused = False 
-            self.pause_event.set()
-            self.stream_finished_event.set()
+            self.mixer.paused = False
 
         if self.stream_thread and self.stream_thread.is_alive():
             self.stream_thread.join(timeout=1.0)
@@ -267,7 +1346,7 @@ class SoundCloudPlayer:
                 return
             print("Pausing...", flush=True)
             self.is_paused = True
-            self.pause_event.clear()
+            self.mixer.paused = True # The callback keeps running and outputs silence
 
 
     def resume(self):
@@ -278,4 +1357,19 @@ class SoundCloudPlayer:
                 return
             print("Resuming...", flush=True)
             self.is_paused = False
-            self.pause_event.set()
+            self.mixer.paused = False
+
+    def close(self):
+        """Stops playback and releases the audio device"""
+        self.stop()
+        self.mixer.close()
+        if self.cache:
+            self.cache.close()
+
+    def announce(self, clip):
+        """Plays an AudioClip over the music without pausing it, the music is ducked meanwhile. Never blocks"""
+        self.mixer.play_overlay(clip)
+
+    def playback_stats(self):
+        """Counters of the mixer, which plays every track of the session"""
+        return self.mixer.stats()
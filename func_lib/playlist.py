@@ -0,0 +1,181 @@
+import threading
+import time
+
+import sclib
+from sclib.sync import get_obj_from
+
+from func_lib.metrics import get_metrics
+
+PAGE_SIZE = sclib.SoundcloudAPI.TRACK_API_MAX_REQUEST_SIZE # Track IDs per metadata request
+RESOLVE_AHEAD = 100 # Tracks resolved ahead of the one playing
+KEEP_BEHIND = 10 # Resolved tracks kept behind the one playing, older ones are dropped again
+RETRY_SECONDS = 2.0 # Wait after a failed metadata request
+
+
+def _complete(stub):
+    """Stubs are raw track dicts, only the first few of a resolve response carry metadata"""
+    return not isinstance(stub, dict) or 'title' in stub
+
+
+class LazyPlaylist:
+    """
+    A playlist whose track metadata is resolved while it plays.
+    The resolve response of a set only has full metadata for its first tracks, the rest are
+    bare IDs. A worker thread fetches them page by page (one request per PAGE_SIZE tracks)
+    and stays at most `ahead` tracks in front of the position last asked for, tracks far
+    behind it are dropped again, so memory does not grow with the set.
+    wait(i) blocks until track i is resolved, get(i) returns it, None for tracks
+    SoundCloud does not return anymore.
+    """
+    def __init__(self, obj, api, ahead=RESOLVE_AHEAD, keep_behind=KEEP_BEHIND, page_size=PAGE_SIZE):
+        self.api = api
+        self.id = obj.get('id')
+        self.title = obj.get('title')
+        self.ahead = ahead
+        self.keep_behind = keep_behind
+        self.page_size = page_size
+
+        self._stubs = list(obj.get('tracks') or [])
+        self._tracks = {} # index -> Track, or None if it is unavailable
+        self._seen = set() # Indices resolved at least once
+        self.position = 0
+        self.unavailable = 0
+        self.requests = 0
+        self.errors = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+        self._thread = threading.Thread(target=self._resolve_loop, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._stubs)
+
+    def wait(self, index, timeout=None):
+        """Moves the resolve window to index and waits for it. Returns False on timeout"""
+        with self._cond:
+            if index != self.position:
+                self.position = index
+                self._cond.notify_all()
+            return self._cond.wait_for(lambda: index in self._tracks or self.closed, timeout) and index in self._tracks
+
+    def get(self, index):
+        """Resolved track at index, None if it is unavailable or not resolved yet"""
+        with self._cond:
+            return self._tracks.get(index)
+
+    def _next_page(self):
+        """
+        Indices the worker should resolve next, all with metadata or all without.
+        Waits for a full page of missing tracks, unless the wanted one or the end of the set is missing.
+        """
+        end = min(len(self._stubs), self.position + self.ahead)
+        missing = [index for index in range(self.position, end) if index not in self._tracks]
+        if not missing or (len(missing) < self.page_size and missing[0] != self.position and end < len(self._stubs)):
+            return []
+        indices = []
+        for index in missing:
+            if indices and _complete(self._stubs[index]) != _complete(self._stubs[indices[0]]):
+                break
+            indices.append(index)
+            if len(indices) == self.page_size:
+                break
+        return indices
+
+    def _evict(self):
+        for index in [index for index in self._tracks if index < self.position - self.keep_behind]:
+            del self._tracks[index]
+
+    def _build(self, obj):
+        if obj is None or not isinstance(obj, dict):
+            return obj
+        try:
+            return sclib.Track(obj=obj, client=self.api)
+        except Exception as e:
+            print(f"Skipping playlist track {obj.get('id')}: {e}", flush=True)
+            return None
+
+    def _fetch(self, indices):
+        """(index, Track or None) for a page, one get_tracks request for the stubs without metadata"""
+        ids = [self._stubs[index]['id'] for index in indices if not _complete(self._stubs[index])]
+        objs = {}
+        if ids:
+            self.requests += 1
+            objs = {obj['id']: obj for obj in self.api.get_tracks(*ids)}
+        pages = []
+        for index in indices:
+            stub = self._stubs[index]
+            pages.append((index, self._build(stub if _complete(stub) else objs.get(stub['id']))))
+        return pages
+
+    def _resolve_loop(self):
+        while True:
+            with self._cond:
+                while not self.closed:
+                    self._evict()
+                    indices = self._next_page()
+                    if indices:
+                        break
+                    self._cond.wait()
+                if self.closed:
+                    return
+
+            try:
+                page = self._fetch(indices)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error resolving playlist tracks: {e}", flush=True)
+                time.sleep(RETRY_SECONDS)
+                continue
+
+            with self._cond:
+                for index, track in page:
+                    self._tracks[index] = track
+                    if index not in self._seen:
+                        self._seen.add(index)
+                        if track is None:
+                            self.unavailable += 1
+                self._cond.notify_all()
+
+    def progress(self):
+        with self._cond:
+            return {
+                'total': len(self._stubs),
+                'resolved': len(self._seen),
+                'unavailable': self.unavailable,
+                'position': self.position,
+                'in_memory': len(self._tracks),
+                'requests': self.requests,
+                'errors': self.errors,
+            }
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+def resolve_playlist(api, url, **kwargs):
+    """
+    Resolves a set URL with a single request and returns a LazyPlaylist, None if the URL
+    is not a playlist. APIs other than sclib's (e.g. offline stand-ins) are asked with
+    their own resolve(), their tracks are used as they are.
+    """
+    if not isinstance(api, sclib.SoundcloudAPI):
+        with get_metrics().timer('soundcloud_resolve_seconds'):
+            resolved = api.resolve(url)
+        if not hasattr(resolved, 'tracks'):
+            return None
+        return LazyPlaylist({'id': getattr(resolved, 'id', None), 'title': getattr(resolved, 'title', None), 'tracks': list(resolved.tracks)}, api, **kwargs)
+
+    if not api.client_id:
+        api.get_credentials()
+    # The transport-backed client has its own get_obj(), plain sclib goes through urllib
+    get_obj = getattr(api, 'get_obj', get_obj_from)
+    with get_metrics().timer('soundcloud_resolve_seconds'):
+        obj = get_obj(api.RESOLVE_URL.format(url=url, client_id=api.client_id))
+    if not obj:
+        raise ValueError(f"Could not resolve {url}")
+    if obj.get('kind') not in ('playlist', 'system-playlist'):
+        return None
+    return LazyPlaylist(obj, api, **kwargs)
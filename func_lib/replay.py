@@ -0,0 +1,168 @@
+import queue
+import threading
+import time
+
+import cv2
+
+from func_lib.emotion import EmotionSmoother, EmotionTimeline
+from func_lib.triggers import TRIGGERS_FILE, TriggerEngine
+from func_lib.vision import FaceGate
+
+SAMPLE_FPS = 5.0 # Frames per second of video that are analyzed, about what the live pipeline manages
+DECODE_QUEUE = 32 # Decoded frames waiting for the model
+MAX_TIMELINE_ENTRIES = 10 ** 7 # A replay keeps the whole session, not just the live retention window
+
+
+class VideoClock:
+    """Clock for replays: returns the timestamp of the frame being processed instead of the wall time"""
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def set(self, timestamp):
+        self.now = timestamp
+
+
+def read_frames(path, sample_fps=SAMPLE_FPS, start=0.0, end=None):
+    """
+    Yields (seconds into the video, frame) for every 1/sample_fps of video between start and end.
+    Frames in between are only grabbed, not converted. sample_fps=None yields every frame.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise OSError(f"Cannot open video {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    if start:
+        cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000.0)
+    interval = 1.0 / sample_fps if sample_fps else 0.0
+    next_time = start
+    index = int(round(start * fps))
+    try:
+        while cap.grab():
+            msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+            # Some containers report no timestamps, fall back to the frame count
+            timestamp = msec / 1000.0 if msec > 0 or index == 0 else index / fps
+            index += 1
+            # Container timestamps are rounded to milliseconds, a frame that is due must not miss by a rounding
+            # error, and one at the end belongs to the range that starts there
+            if end is not None and timestamp >= end - 0.0005:
+                break
+            if interval and timestamp < next_time - 0.0005:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+            while interval and next_time <= timestamp + 0.0005:
+                next_time += interval
+            yield timestamp, frame
+    finally:
+        cap.release()
+
+
+def decode_ahead(frames, size=DECODE_QUEUE):
+    """Runs a frame generator on its own thread, so decoding overlaps with the model"""
+    items = queue.Queue(maxsize=size)
+    done = object()
+
+    def produce():
+        try:
+            for item in frames:
+                items.put(item)
+        except Exception as e:
+            print(f"Error reading video: {e}", flush=True)
+        finally:
+            items.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = items.get()
+        if item is done:
+            return
+        yield item
+
+
+def load_analyzer(face_gate=None):
+    """analyze(frame) as in main.py: Haar face gate, then DeepFace on the face crop only"""
+    from deepface import DeepFace
+
+    if face_gate is None:
+        face_gate = FaceGate(cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml"))
+
+    def analyze(frame):
+        box = face_gate.locate(frame)
+        if box is None:
+            return None
+        rgb_face = cv2.cvtColor(face_gate.crop(frame, box), cv2.COLOR_BGR2RGB)
+        return DeepFace.analyze(rgb_face, actions=['emotion'], detector_backend='skip', enforce_detection=False)
+
+    return analyze
+
+
+def evaluate(samples, triggers_path=TRIGGERS_FILE, start=0.0, session_start=0.0):
+    """
+    Feeds (seconds into the video, emotion scores) samples through the smoother, an
+    EmotionTimeline and the trigger rules, scores are None while nobody is there.
+    Time comes from the samples (offset by session_start), so windows and cooldowns
+    behave as they would have live.
+    Returns the timeline changes, its distribution and the rules that would have fired.
+    """
+    clock = VideoClock(session_start + start)
+    timeline = EmotionTimeline(clock(), 'neutral', horizon=float('inf'), max_entries=MAX_TIMELINE_ENTRIES)
+    triggers = TriggerEngine(timeline, path=triggers_path, reload_interval=float('inf'), clock=clock)
+    smoother = EmotionSmoother()
+
+    changes = [(timeline.start_time, timeline.current)]
+    fired = []
+    for timestamp, scores in samples:
+        clock.set(session_start + timestamp)
+        emotion = smoother.update(clock(), scores)
+        if timeline.record(clock(), emotion):
+            changes.append((clock(), emotion))
+        rule = triggers.evaluate()
+        if rule:
+            fired.append({'time': clock(), 'rule': rule.name, 'emotion': rule.emotion, 'track': rule.track, 'announcement': rule.announcement})
+
+    duration = clock() - timeline.start_time
+    return {
+        'start': timeline.start_time,
+        'end': clock(),
+        'timeline': changes,
+        'distribution': timeline.distribution(timeline.start_time, clock()) if duration > 0 else {},
+        'triggers': fired,
+    }
+
+
+def replay(path, analyze, triggers_path=TRIGGERS_FILE, sample_fps=SAMPLE_FPS, start=0.0, end=None, session_start=0.0):
+    """
+    Runs a recorded session through analyze(frame), the emotion timeline and the trigger
+    rules in this process, as fast as the model allows.
+    Returns what evaluate() returns plus throughput numbers.
+    """
+    counts = {'analyzed': 0, 'errors': 0}
+
+    def samples():
+        for timestamp, frame in decode_ahead(read_frames(path, sample_fps, start, end)):
+            try:
+                analysis = analyze(frame)
+            except Exception as e:
+                counts['errors'] += 1
+                print(f"Error at {timestamp:.2f}s: {e}", flush=True)
+                continue
+            counts['analyzed'] += 1
+            yield timestamp, None if analysis is None else analysis[0]['emotion']
+
+    started = time.perf_counter()
+    result = evaluate(samples(), triggers_path, start, session_start)
+    elapsed = time.perf_counter() - started
+
+    duration = result['end'] - result['start']
+    result.update({
+        'video': path,
+        'analyzed_frames': counts['analyzed'],
+        'errors': counts['errors'],
+        'elapsed': elapsed,
+        'speed': duration / elapsed if elapsed > 0 else None, # x real time
+    })
+    return result
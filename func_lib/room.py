@@ -0,0 +1,131 @@
+import time
+from collections import Counter
+
+from func_lib.batch import FaceBatch, load_emotion_model
+from func_lib.emotion import ABSENT, RETENTION_SECONDS, EmotionSmoother, EmotionTimeline
+from func_lib.vision import FaceTracker
+
+MAX_FACES = 16 # Faces analyzed per frame, the largest ones win
+
+
+class RoomAnalyzer:
+    """
+    analyze(frame) for room mode: every face in the frame is tracked and all face crops
+    go through the emotion model in one batched call.
+    Returns a DeepFace-like list with one dict per face ('face_id', 'region', 'emotion',
+    'dominant_emotion'), None if nobody is there.
+    """
+    def __init__(self, face_gate, model=None, tracker=None, max_faces=MAX_FACES):
+        self.face_gate = face_gate
+        self.tracker = tracker if tracker is not None else FaceTracker()
+        self.batch = FaceBatch(model if model is not None else load_emotion_model(), max_faces)
+        self.max_faces = max_faces
+        self.faces_analyzed = 0
+
+    def __call__(self, frame):
+        faces = self.tracker.update(self.face_gate.locate_all(frame)[:self.max_faces])
+        if not faces:
+            return None
+        for i, (_, box) in enumerate(faces):
+            self.batch.add(i, self.face_gate.crop(frame, box))
+        scores = dict(self.batch.run())
+        self.faces_analyzed += len(faces)
+        return [
+            {'face_id': face_id, 'region': {'x': box[0], 'y': box[1], 'w': box[2], 'h': box[3]}, 'emotion': scores[i], 'dominant_emotion': max(scores[i], key=scores[i].get)}
+            for i, (face_id, box) in enumerate(faces)
+        ]
+
+    def stats(self):
+        stats = self.tracker.stats()
+        stats.update({
+            'model_passes': self.batch.passes,
+            'faces_analyzed': self.faces_analyzed,
+            'faces_per_pass': round(self.faces_analyzed / self.batch.passes, 2) if self.batch.passes else 0.0,
+        })
+        return stats
+
+
+class RoomMood:
+    """
+    Smoothed emotion timelines of every tracked face plus the room as a whole. It can stand in for
+    an EmotionTimeline wherever one is read (TriggerEngine, InferenceScheduler).
+    While somebody is there, the room's share of an emotion is its share of all face-seconds,
+    so three happy faces outweigh one sad one. Time without any face counts as absent.
+    current/last_change follow the majority emotion of every update.
+    """
+    def __init__(self, start_time=None, initial_emotion='neutral', horizon=RETENTION_SECONDS, clock=time.time):
+        self.room = EmotionTimeline(start_time, initial_emotion, horizon, clock=clock)
+        self.labels = self.room.labels
+        self.horizon = horizon
+        self.faces = {} # face ID -> EmotionTimeline
+        self.smoothers = {} # face ID -> EmotionSmoother
+
+    def __len__(self):
+        return len(self.room)
+
+    @property
+    def start_time(self):
+        return self.room.start_time
+
+    @property
+    def current(self):
+        return self.room.current
+
+    @property
+    def last_change(self):
+        return self.room.last_change
+
+    def record(self, timestamp, faces):
+        """
+        faces: [(face ID, emotion scores)] of one analyzed frame, empty if nobody is there.
+        Returns True if the room's majority emotion changed.
+        """
+        present = set()
+        emotions = []
+        for face_id, scores in faces:
+            smoother = self.smoothers.setdefault(face_id, EmotionSmoother())
+            emotion = smoother.update(timestamp, scores)
+            emotions.append(emotion)
+            timeline = self.faces.get(face_id)
+            if timeline is None:
+                self.faces[face_id] = EmotionTimeline(timestamp, emotion, self.horizon)
+            else:
+                timeline.record(timestamp, emotion)
+            present.add(face_id)
+        for face_id, timeline in list(self.faces.items()):
+            if face_id in present:
+                continue
+            timeline.record(timestamp, ABSENT)
+            # Gone for longer than any window can look back
+            if timestamp - timeline.last_change > self.horizon:
+                del self.faces[face_id]
+                del self.smoothers[face_id]
+
+        counts = Counter(emotions)
+        return self.room.record(timestamp, counts.most_common(1)[0][0] if counts else ABSENT)
+
+    def face_distribution(self, face_id, a, b):
+        """Distribution of a single face, None if it is not tracked (anymore)"""
+        timeline = self.faces.get(face_id)
+        return timeline.distribution(a, b) if timeline is not None else None
+
+    def distribution(self, a, b):
+        """Percentage of [a, b] per emotion for the whole room, same format as EmotionTimeline.distribution"""
+        room = self.room.durations(a, b)
+        total = sum(room.values())
+        face_seconds = {label: 0.0 for label in self.labels}
+        for timeline in self.faces.values():
+            for label, seconds in timeline.durations(a, b).items():
+                face_seconds[label] += seconds
+        face_seconds[ABSENT] = 0.0
+        face_total = sum(face_seconds.values())
+        if total <= 0 or face_total <= 0:
+            return self.room.distribution(a, b)
+
+        present = 100.0 * (1.0 - room[ABSENT] / total)
+        distribution = {label: present * seconds / face_total for label, seconds in face_seconds.items()}
+        distribution[ABSENT] = 100.0 - present
+        return distribution
+
+    def stats(self):
+        return {'faces': len(self.faces), 'present': sum(1 for timeline in self.faces.values() if timeline.current != ABSENT)}
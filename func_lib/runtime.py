@@ -0,0 +1,339 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Everything startup is measured from, main.py imports this module before anything heavy
+PROCESS_START = time.perf_counter()
+
+import numpy as np
+
+from func_lib.emotion import EmotionSmoother, EmotionTimeline, get_emotion_duration
+from func_lib.metrics import get_metrics
+from func_lib.session_log import SessionLog
+from func_lib.triggers import TRIGGERS_FILE, TriggerEngine
+
+CAMERA_INDEX = 0 # Default webcam
+MODEL_INPUT = 48 # Side of the grayscale face the emotion model expects
+# Phases that run next to the main thread, the others add up to the time until the prompt
+BACKGROUND_PHASES = ('camera_open', 'deepface_import', 'model_load', 'model_warmup')
+
+
+class StartupProfile:
+    """
+    Wall time of every startup phase, measured from PROCESS_START. Phases can run on any
+    thread, marks are moments (first frame, first analysis). report() prints the breakdown.
+    """
+    def __init__(self, origin=PROCESS_START):
+        self.origin = origin
+        self.phases = {} # name -> (start, end) in seconds since origin
+        self.marks = {} # name -> seconds since origin
+        self.lock = threading.Lock()
+
+    def now(self):
+        return time.perf_counter() - self.origin
+
+    def phase(self, name):
+        """with profile.phase('model_load'): ..."""
+        return _Phase(self, name)
+
+    def mark(self, name):
+        """Records the first time name happened, later calls keep the first one"""
+        with self.lock:
+            self.marks.setdefault(name, self.now())
+
+    def breakdown(self):
+        with self.lock:
+            breakdown = {name: round(end - start, 3) for name, (start, end) in self.phases.items()}
+            breakdown.update({name: round(moment, 3) for name, moment in self.marks.items()})
+            return breakdown
+
+    def report(self):
+        with self.lock:
+            phases = sorted(self.phases.items(), key=lambda item: item[1][0])
+            marks = sorted(self.marks.items(), key=lambda item: item[1])
+        parts = [f"{name} {end - start:.2f}s{' (background)' if name in BACKGROUND_PHASES else ''}" for name, (start, end) in phases]
+        parts += [f"{name} at {moment:.2f}s" for name, moment in marks]
+        print("Startup: " + " | ".join(parts), flush=True)
+
+
+class _Phase:
+    __slots__ = ('profile', 'name', 'start')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = self.profile.now()
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.profile.lock:
+            self.profile.phases[self.name] = (self.start, self.profile.now())
+        return False
+
+
+def open_camera(profile, index=CAMERA_INDEX):
+    """cv2.VideoCapture(index), opening a webcam can take a second"""
+    import cv2
+
+    with profile.phase('camera_open'):
+        return cv2.VideoCapture(index)
+
+
+def load_analyzer(profile, batched=False):
+    """
+    Imports DeepFace (and with it TensorFlow), builds the emotion model and runs a dummy
+    face through it, so neither the import nor the graph build happens in the live loop.
+    batched: returns the Keras model for room mode's FaceBatch, otherwise the DeepFace module
+    with analyze() warmed up.
+    """
+    with profile.phase('deepface_import'):
+        from deepface import DeepFace
+
+    if batched:
+        from func_lib.batch import load_emotion_model
+
+        with profile.phase('model_load'):
+            model = load_emotion_model()
+        with profile.phase('model_warmup'):
+            model.predict_on_batch(np.zeros((1, MODEL_INPUT, MODEL_INPUT, 1), dtype=np.float32))
+        profile.mark('model_ready')
+        return model
+
+    # DeepFace builds and caches its models on the first analyze(), a dummy face triggers that
+    with profile.phase('model_warmup'):
+        DeepFace.analyze(np.zeros((MODEL_INPUT, MODEL_INPUT, 3), dtype=np.uint8), actions=['emotion'], detector_backend='skip', enforce_detection=False)
+    profile.mark('model_ready')
+    return DeepFace
+
+
+class WarmingModel:
+    """
+    Stand-in for the Keras model while the loader thread still builds it: the first
+    predict_on_batch() waits for it, on the inference thread and not the UI.
+    """
+    def __init__(self, future):
+        self.future = future
+
+    def predict_on_batch(self, batch):
+        return self.future.result().predict_on_batch(batch)
+
+
+def run(room_mode=False, metrics_port=None, metrics_file=None, session_log_dir=None, cascade_path=None, camera_index=CAMERA_INDEX, triggers_path=TRIGGERS_FILE):
+    """
+    The live app behind main.py and executable.py. Camera and emotion model are loaded on
+    background threads while the player stack is imported and the playlist URL is typed in,
+    the live loop starts as soon as the camera is open and the first analysis follows once
+    the model is warm.
+    """
+    profile = StartupProfile()
+    background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup")
+    camera = background.submit(open_camera, profile, camera_index)
+    analyzer = background.submit(load_analyzer, profile, room_mode)
+    background.shutdown(wait=False) # Both keep running, their results are picked up later
+
+    # The rest of the heavy stacks (OpenCV, sounddevice, requests/sclib) load meanwhile
+    with profile.phase('imports'):
+        import cv2
+
+        from func_lib.cache import TrackCache
+        from func_lib.music import SoundCloudPlayer
+        from func_lib.room import RoomAnalyzer, RoomMood
+        from func_lib.speech import Announcements
+        from func_lib.vision import CaptureStage, DisplayStats, FaceGate, InferenceScheduler, InferenceStage
+
+    with profile.phase('setup'):
+        # Latency histograms of every stage in Prometheus format, off unless a port or file is given
+        metrics = get_metrics()
+        if metrics_port or metrics_file:
+            metrics.start(path=metrics_file, port=metrics_port)
+
+        session_log = SessionLog(session_log_dir) if session_log_dir else None
+
+        # Announcements are rendered to audio once in the background and mixed over the music
+        announcements = Announcements()
+
+        # Face detector used to gate the emotion model
+        face_cascade = cv2.CascadeClassifier(cascade_path or cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+        # Timeline of emotion changes (bounded, replaces the old {timestamp: emotion} dict)
+        emotion_changes = EmotionTimeline(time.time(), 'neutral') # Start time : emotion -> Duration is start time [a] - start time [a+1]
+        # All seven scores of every frame are smoothed, the timeline gets the smoothed label
+        smoother = EmotionSmoother()
+        if room_mode:
+            # One timeline per face, triggers see the distribution of the whole room
+            emotion_changes = RoomMood(time.time(), 'neutral')
+
+        def on_track(track, index):
+            if session_log:
+                session_log.event(time.time(), 'track' if index is not None else 'interrupt', title=track.title, index=index)
+
+        # Tracks are kept on disk, so repeated interrupt tracks start without a download
+        player = SoundCloudPlayer(cache=TrackCache(), on_track=on_track)
+
+        # Reaction rules and their interrupt tracks come from triggers.json, edits are picked up while running.
+        # The interrupt tracks are resolved in the background while the user types the URL
+        def on_triggers_loaded(trigger_engine):
+            player.add_interrupt_tracks(trigger_engine.tracks)
+            announcements.prepare(rule.announcement for rule in trigger_engine.rules)
+
+        triggers = TriggerEngine(emotion_changes, path=triggers_path, on_reload=on_triggers_loaded)
+
+    profile.mark('prompt')
+    with profile.phase('waiting_for_url'):
+        playlist_url = input("Please enter the SoundCloud playlist URL: ") # https://soundcloud.com/sc-playlists-de/sets/techno-machinista
+
+    if session_log:
+        session_log.event(time.time(), 'session', playlist=playlist_url, room_mode=room_mode)
+    player.start_playlist(playlist_url)
+
+    start_time = time.time()
+
+    # Cheap Haar face detection decides if the emotion model has to run at all
+    face_gate = FaceGate(face_cascade)
+
+    def analyze_frame(frame):
+        box = face_gate.locate(frame)
+        if box is None:
+            return None # Nobody at the desk, skip the emotion model
+        # Convert the face crop to RGB for DeepFace
+        with metrics.timer('color_convert_seconds'):
+            rgb_face = cv2.cvtColor(face_gate.crop(frame, box), cv2.COLOR_BGR2RGB)
+        # Waits for the warm-up only until the first face, on the inference thread
+        DeepFace = analyzer.result()
+        # Analyze emotion, the crop already is the face so DeepFace's own detector is skipped
+        with metrics.timer('model_seconds'):
+            return DeepFace.analyze(rgb_face, actions=['emotion'], detector_backend='skip', enforce_detection=False)
+
+    if room_mode:
+        # All faces of a frame go through the emotion model in a single batched call
+        analyze_frame = RoomAnalyzer(face_gate, model=WarmingModel(analyzer))
+    room_faces = []
+
+    with profile.phase('camera_wait'):
+        cap = camera.result()
+
+    # Pipeline: capture thread -> inference worker -> UI loop, every stage only looks at the newest frame
+    capture = CaptureStage(cap)
+    # Sets the analysis rate and detection resolution from CPU budget, motion and emotion stability
+    scheduler = InferenceScheduler(timeline=emotion_changes, face_gate=face_gate)
+    inference = InferenceStage(capture.frames, analyze_frame, scheduler=scheduler)
+    display = DisplayStats()
+    capture.start()
+    inference.start()
+
+    last_result_seq = 0
+    last_stats = time.time()
+    startup_reported = False
+
+    def print_pipeline_stats():
+        print(f"Capture: {capture.stats()} | Faces: {face_gate.stats()} | Inference: {inference.stats()} | UI: {display.stats(capture.frames)} | Triggers: {triggers.stats()} | Room: {analyze_frame.stats() if room_mode else None} | Playlist: {player.playlist_progress()} | Network: {player.transport.stats()}", flush=True)
+
+    while True:
+        seq, item = capture.frames.get(display.last_seq, timeout=1.0)
+        if item is None:
+            if capture.frames.closed:
+                break
+            continue
+        display.shown(seq)
+        profile.mark('first_frame')
+        # Draw on a copy, the inference worker may still be reading this frame
+        frame = item[1].copy()
+
+        try:
+            result_seq, result = inference.results.peek()
+            if result_seq > last_result_seq:
+                profile.mark('first_analysis')
+                last_result_seq = result_seq
+                frame_time, analysis = result
+
+                with metrics.timer('timeline_update_seconds'):
+                    if room_mode:
+                        # Every tracked face updates its own timeline
+                        room_faces = analysis or []
+                        emotion_changes.record(frame_time, [(face['face_id'], face['emotion']) for face in room_faces])
+                        if session_log:
+                            # The log keeps the mean of the room per frame
+                            scores = {label: sum(face['emotion'][label] for face in room_faces) / len(room_faces) for label in room_faces[0]['emotion']} if room_faces else None
+                            session_log.append(frame_time, scores, faces=len(room_faces))
+                    else:
+                        # Get dominant emotion, a single noisy frame does not flip it
+                        dominant_emotion = smoother.update(frame_time, None if analysis is None else analysis[0]['emotion'])
+                        confidence = smoother.confidence
+
+                        # Only records the time if the emotion changed
+                        emotion_changes.record(frame_time, dominant_emotion)
+                        if session_log:
+                            session_log.append(frame_time, None if analysis is None else analysis[0]['emotion'])
+                emotion_distribution_overall =  get_emotion_duration(start_time, time.time(),emotion_changes)
+
+                # Here is now the Emotion Event section, all rules from triggers.json are checked on every update
+                # e.g. 5 seconds Happy (>40%) -> OMG-Moment, Sad (>80%) -> Power Music, Angry (>80%) -> Lofi Music
+                with metrics.timer('trigger_evaluate_seconds'):
+                    rule = triggers.evaluate()
+                if rule:
+                    print(f"Trigger {rule.name}: {rule.emotion} > {rule.threshold}% in the last {rule.window}s", flush=True)
+                    if rule.announcement:
+                        print(rule.announcement)
+                        clip = announcements.get(rule.announcement)
+                        if clip:
+                            player.announce(clip) # Ducked over the music, does not block this loop
+                        else:
+                            print("Announcement is not rendered yet, skipping it.")
+                    if session_log:
+                        session_log.event(frame_time, 'trigger', rule=rule.name, emotion=rule.emotion, track=rule.track)
+                    # frame_time is when the camera saw the expression, the mixer measures from there
+                    player.interrupt(rule.track, cause_time=frame_time)
+
+            # ---- Notes ----
+            # Two Reaction "Types":
+            # 1. Reaction to the Song -> Like or Dislike <- Kind of hard to measure
+            # Would mean to differentiate between song related and unrelated emotions and also being able to feed the information to a suitable algorithm
+            # 2. Reaction unrelated to music -> Success / Focus / Neutral / Sadness / Anger
+            # This means that if in the last 10/5/3 seconds was a lot of anger, we can assume that the user is angry and we can react to that
+
+            # Reaction type 2. is here implemented and is the main focus of this project
+
+            # Display results, the most recent analysis is overlaid on every frame
+            cv2.putText(frame, f"{emotion_changes.current}",
+                   (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 1)
+            for face in room_faces:
+                region = face['region']
+                cv2.rectangle(frame, (region['x'], region['y']), (region['x'] + region['w'], region['y'] + region['h']), (0, 255, 0), 1)
+                cv2.putText(frame, f"#{face['face_id']} {face['dominant_emotion']}",
+                       (region['x'], max(10, region['y'] - 5)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+            # The playlist's track list keeps loading while the first tracks play
+            progress = player.playlist_progress()
+            if progress and progress['resolved'] < progress['total']:
+                cv2.putText(frame, f"Playlist: {progress['resolved']}/{progress['total']} tracks loaded",
+                       (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            elif not analyzer.done():
+                cv2.putText(frame, "Loading the emotion model...",
+                       (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        except Exception as e:
+            print(f"Error: {e}")
+        # Startup is over once a frame was analyzed with the warm model (or without a face meanwhile)
+        if not startup_reported and last_result_seq and analyzer.done():
+            startup_reported = True
+            profile.report()
+        # Show live feed
+        cv2.imshow("Emotion Recognition", frame)
+        if time.time() - last_stats >= 30:
+            last_stats = time.time()
+            print_pipeline_stats()
+        # Exit on 'q' key
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+    print_pipeline_stats()
+    if not startup_reported:
+        profile.report()
+    capture.stop()
+    inference.stop()
+    capture.join(timeout=1.0)
+    cap.release()
+    player.close() # Releases the audio device
+    if session_log:
+        session_log.close()
+    cv2.destroyAllWindows()
@@ -0,0 +1,380 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from func_lib.batch import FaceBatch
+from func_lib.emotion import EmotionSmoother, EmotionTimeline
+from func_lib.metrics import get_metrics
+from func_lib.replay import VideoClock
+from func_lib.triggers import TRIGGERS_FILE, TriggerConfig, TriggerEngine
+from func_lib.vision import FaceGate
+
+HOST = '127.0.0.1' # Local clients only, 0.0.0.0 serves the whole network
+PORT = 8765
+BATCH_SIZE = 32 # Faces of different clients per model call
+MAX_WAIT = 0.005 # Seconds a batch waits for more clients' frames once a worker is free
+WORKERS = 2 # Batches in flight at once, each on its own thread
+MAX_CLIENTS = 64
+MAX_FRAME_BYTES = 4 * 1024 * 1024 # Larger frames close the connection
+MAX_WRITE_BUFFER = 256 * 1024 # Bytes queued to a client that does not read, emotion updates are skipped then
+CASCADE_FILE = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+
+metrics = get_metrics()
+
+# Protocol: newline terminated JSON messages, a frame message is followed by `size` bytes of JPEG.
+# client -> server: {"type": "hello", "client": "desk-3"}  (optional, first)
+#                   {"type": "frame", "time": 1712345678.25, "size": 23512} + JPEG
+# server -> client: {"type": "welcome", "client": "desk-3"}
+#                   {"type": "emotion", "time": ..., "emotion": "happy", "confidence": 71.3}
+#                   {"type": "trigger", "time": ..., "rule": "OMG", "emotion": "happy", "track": "happy", "announcement": ...}
+#                   {"type": "error", "message": ...}
+
+
+def encode_message(message):
+    return (json.dumps(message) + "\n").encode('utf-8')
+
+
+class ClientSession:
+    """
+    State of one connected client: the newest frame waiting for analysis (an older one is
+    dropped when a newer arrives), its own smoother, timeline and state of the trigger rules
+    (from the service's shared config), all in the client's frame time. Only the event loop touches the state, the face gate is used by
+    the worker analyzing this client's single frame in flight.
+    """
+    def __init__(self, client_id, writer, face_gate, trigger_config):
+        self.client_id = client_id
+        self.writer = writer
+        self.face_gate = face_gate
+        self.pending = None # (frame time, JPEG bytes, arrival) not picked by a batch yet
+        self.in_flight = False
+        self.clock = VideoClock()
+        self.timeline = None # Created with the first frame, in the client's time
+        self.trigger_config = trigger_config
+        self.triggers = None
+        self.smoother = EmotionSmoother()
+        self.received = 0
+        self.dropped = 0
+        self.analyzed = 0
+        self.errors = 0
+        self.fired = 0
+        self.skipped_updates = 0
+
+    def offer(self, frame_time, jpeg):
+        """Keeps only the newest frame, returns True if an older one was dropped for it"""
+        self.received += 1
+        replaced = self.pending is not None
+        if replaced:
+            self.dropped += 1
+        self.pending = (frame_time, jpeg, time.perf_counter())
+        return replaced
+
+    def send(self, message, essential=True):
+        """Queues message to the client, non-essential ones are skipped while it does not read"""
+        if self.writer.is_closing():
+            return False
+        if not essential and self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.skipped_updates += 1
+            return False
+        self.writer.write(encode_message(message))
+        return True
+
+    def record(self, frame_time, scores):
+        """Smoothing, timeline and triggers for one analyzed frame, returns the rule that fired"""
+        self.clock.set(frame_time)
+        if self.timeline is None:
+            self.timeline = EmotionTimeline(frame_time, 'neutral', clock=self.clock)
+            self.triggers = TriggerEngine(self.timeline, clock=self.clock, config=self.trigger_config)
+        self.analyzed += 1
+        emotion = self.smoother.update(frame_time, scores)
+        if self.timeline.record(frame_time, emotion):
+            self.send({'type': 'emotion', 'time': frame_time, 'emotion': emotion, 'confidence': self.smoother.confidence}, essential=False)
+        rule = self.triggers.evaluate()
+        if rule:
+            self.fired += 1
+            self.send({'type': 'trigger', 'time': frame_time, 'rule': rule.name, 'emotion': rule.emotion, 'track': rule.track, 'announcement': rule.announcement})
+        return rule
+
+    def stats(self):
+        return {'received': self.received, 'dropped': self.dropped, 'analyzed': self.analyzed, 'errors': self.errors, 'fired': self.fired,
+                'skipped_updates': self.skipped_updates}
+
+
+class EmotionService:
+    """
+    Headless analysis for many desks: clients stream JPEG frames over TCP, the service keeps
+    an emotion timeline and trigger rules per client and pushes emotion changes and triggers
+    back. Frames of different clients are micro-batched into one call of the emotion model
+    (the Keras model behind DeepFace.analyze) on a small thread pool.
+    Backpressure: every client has at most one frame in flight and one waiting, a newer frame
+    replaces the waiting one, so a slow model lowers each client's analysis rate instead of
+    building up queues.
+    """
+    def __init__(self, model, face_gate_factory=None, triggers_path=TRIGGERS_FILE, batch_size=BATCH_SIZE, max_wait=MAX_WAIT,
+                 workers=WORKERS, max_clients=MAX_CLIENTS):
+        self.model = model
+        self.face_gate_factory = face_gate_factory or (lambda: FaceGate(cv2.CascadeClassifier(CASCADE_FILE)))
+        self.trigger_config = TriggerConfig(triggers_path) # Read once for all clients, reloaded when it changes
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self.max_clients = max_clients
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self.local = threading.local() # One FaceBatch per worker thread
+        self.clients = {} # client ID -> ClientSession
+        self.connections = set() # Tasks serving a connection, finished on stop()
+        self.server = None
+        self.port = None
+        self.batcher = None
+        self.arrived = None # asyncio.Event, set when a client has a frame ready
+        self.free_workers = None # asyncio.Semaphore
+        self.batches = 0
+        self.batched_frames = 0
+        self.rejected = 0
+        self.started = None
+
+    async def start(self, host=HOST, port=PORT):
+        """Listens on host:port (0 picks a free port, see self.port) and starts batching"""
+        self.arrived = asyncio.Event()
+        self.free_workers = asyncio.Semaphore(self.workers)
+        self.server = await asyncio.start_server(self._handle_client, host, port, limit=64 * 1024)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.batcher = asyncio.ensure_future(self._batch_loop())
+        self.started = time.perf_counter()
+        print(f"Emotion service listening on {host}:{self.port}", flush=True)
+        return self
+
+    async def stop(self):
+        if self.batcher is not None:
+            self.batcher.cancel()
+            self.batcher = None
+        for task in list(self.connections):
+            task.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        # Waits for the batches still on the workers without blocking the event loop meanwhile
+        await asyncio.get_running_loop().run_in_executor(None, self.pool.shutdown)
+
+    async def serve_forever(self, host=HOST, port=PORT):
+        await self.start(host, port)
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle_client(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        client = None
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(encode_message({'type': 'error', 'message': "Message line too long"}))
+                    break
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    kind = message['type']
+                    if kind == 'frame':
+                        size = int(message.get('size', 0))
+                        frame_time = float(message.get('time') or time.time())
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    writer.write(encode_message({'type': 'error', 'message': "Expected a JSON message per line"}))
+                    break
+
+                if client is None:
+                    client_id = str(message.get('client') or f"{peer[0]}:{peer[1]}") if kind == 'hello' else f"{peer[0]}:{peer[1]}"
+                    client = self._register(client_id, writer)
+                    if client is None:
+                        break
+
+                if kind == 'frame':
+                    if not 0 < size <= MAX_FRAME_BYTES:
+                        client.send({'type': 'error', 'message': f"Frame size must be 1..{MAX_FRAME_BYTES} bytes"})
+                        break
+                    jpeg = await reader.readexactly(size)
+                    client.offer(frame_time, jpeg)
+                    if not client.in_flight:
+                        self.arrived.set()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass # Client went away in the middle of a frame
+        except asyncio.CancelledError:
+            pass # The service stops
+        finally:
+            self.connections.discard(task)
+            if client is not None and self.clients.get(client.client_id) is client:
+                del self.clients[client.client_id]
+                print(f"Client {client.client_id} left: {client.stats()}", flush=True)
+            writer.close()
+
+    def _register(self, client_id, writer):
+        if len(self.clients) >= self.max_clients or client_id in self.clients:
+            self.rejected += 1
+            reason = "Too many clients" if len(self.clients) >= self.max_clients else f"Client {client_id} is already connected"
+            writer.write(encode_message({'type': 'error', 'message': reason}))
+            return None
+        client = ClientSession(client_id, writer, self.face_gate_factory(), self.trigger_config)
+        self.clients[client_id] = client
+        client.send({'type': 'welcome', 'client': client_id})
+        print(f"Client {client_id} connected.", flush=True)
+        return client
+
+    def _ready(self):
+        """Clients with a frame waiting and none in flight, the longest waiting first"""
+        ready = [client for client in self.clients.values() if client.pending is not None and not client.in_flight]
+        ready.sort(key=lambda client: client.pending[2])
+        return ready
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.arrived.wait()
+            await self.free_workers.acquire()
+            # A worker is free, give the other clients a moment to fill the batch
+            deadline = loop.time() + self.max_wait
+            while len(self._ready()) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self.arrived.clear()
+                try:
+                    await asyncio.wait_for(self.arrived.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            items = []
+            for client in self._ready()[:self.batch_size]:
+                frame_time, jpeg, arrival = client.pending
+                client.pending = None
+                client.in_flight = True
+                items.append((client, frame_time, jpeg, arrival))
+            if not self._ready():
+                self.arrived.clear()
+            if not items:
+                self.free_workers.release()
+                continue
+            asyncio.ensure_future(self._run_batch(items))
+
+    async def _run_batch(self, items):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.pool, self._analyze, [(client.face_gate, jpeg) for client, _, jpeg, _ in items])
+        except Exception as e:
+            print(f"Error analyzing a batch: {e}", flush=True)
+            results = [e] * len(items)
+        finally:
+            self.free_workers.release()
+        self.batches += 1
+        self.batched_frames += len(items)
+
+        now = time.perf_counter()
+        # Released first, a client whose results fail below must not block the others' next frames
+        for client, _, _, _ in items:
+            client.in_flight = False
+            if client.pending is not None:
+                self.arrived.set() # Its next frame came in meanwhile
+        for (client, frame_time, _, arrival), scores in zip(items, results):
+            if isinstance(scores, Exception):
+                client.errors += 1
+                client.send({'type': 'error', 'message': str(scores)}, essential=False)
+                continue
+            if self.clients.get(client.client_id) is not client:
+                continue # Left while its frame was analyzed
+            metrics.observe('service_frame_seconds', now - arrival)
+            try:
+                client.record(frame_time, scores)
+            except Exception as e:
+                print(f"Error recording a frame of client {client.client_id}: {e}", flush=True)
+                client.errors += 1
+                client.send({'type': 'error', 'message': str(e)}, essential=False)
+
+    def _analyze(self, items):
+        """
+        Worker thread: decodes every JPEG, finds the face with the client's face gate and runs
+        all faces through one forward pass. Returns scores, None (no face) or an exception per item.
+        """
+        batch = getattr(self.local, 'batch', None)
+        if batch is None or len(batch.inputs) < self.batch_size:
+            batch = self.local.batch = FaceBatch(self.model, self.batch_size)
+        results = [None] * len(items)
+        for i, (face_gate, jpeg) in enumerate(items):
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                results[i] = ValueError("Frame is not a valid JPEG")
+                continue
+            box = face_gate.locate(frame) # A real detection records face_detect_seconds itself
+            if box is not None:
+                batch.add(i, face_gate.crop(frame, box))
+        for i, scores in batch.run():
+            results[i] = scores
+        return results
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        clients = [client.stats() for client in self.clients.values()]
+        return {
+            'clients': len(clients),
+            'received': sum(client['received'] for client in clients),
+            'dropped': sum(client['dropped'] for client in clients),
+            'analyzed': sum(client['analyzed'] for client in clients),
+            'batches': self.batches,
+            'frames_per_batch': round(self.batched_frames / self.batches, 2) if self.batches else 0.0,
+            'frames_per_second': round(self.batched_frames / elapsed, 1) if elapsed else 0.0,
+            'rejected': self.rejected,
+        }
+
+
+class ServiceClient:
+    """
+    Minimal asyncio client of the EmotionService, e.g. on a desk or in the load generator:
+    send_frame() a BGR frame or JPEG bytes, messages are read with receive().
+    """
+    def __init__(self, client_id=None, jpeg_quality=80):
+        self.client_id = client_id
+        self.jpeg_quality = jpeg_quality
+        self.reader = None
+        self.writer = None
+
+    async def connect(self, host=HOST, port=PORT):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        if self.client_id:
+            self.writer.write(encode_message({'type': 'hello', 'client': self.client_id}))
+        return self
+
+    def encode(self, frame):
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("Could not encode the frame as JPEG")
+        return jpeg.tobytes()
+
+    async def send_frame(self, frame, frame_time=None):
+        """frame: BGR image or JPEG bytes. Waits while the socket's send buffer is full"""
+        jpeg = frame if isinstance(frame, (bytes, bytearray)) else self.encode(frame)
+        self.writer.write(encode_message({'type': 'frame', 'time': time.time() if frame_time is None else frame_time, 'size': len(jpeg)}))
+        self.writer.write(jpeg)
+        await self.writer.drain()
+
+    async def receive(self):
+        """Next message from the service, None once the connection is closed"""
+        line = await self.reader.readline()
+        return json.loads(line) if line else None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+            self.writer = None
@@ -0,0 +1,266 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from func_lib.emotion import emotions
+
+# One log per user, sessions are appended to it. Not next to the code: a frozen build unpacks
+# that into a temporary directory which is deleted at exit
+SESSION_LOG_DIR = os.path.join(os.path.expanduser("~"), ".cache", "music_feel", "sessions")
+SEGMENT_ROWS = 1 << 16 # Frames per segment file, ~2.4 MB, about an hour at the usual analysis rate
+HEADER_BYTES = 64
+MAGIC = 0x31474F4C464D # "MFLOG1"
+META_FILE = "log.json"
+EVENTS_FILE = "events.jsonl"
+SEGMENT_PATTERN = "segment_{:06d}.bin"
+
+# Header slots (8 bytes each): magic, capacity, rows as int64 and first/last timestamp as float64
+_MAGIC, _CAPACITY, _ROWS, _FIRST, _LAST = range(5)
+
+
+class Segment:
+    """
+    One fixed-size memory-mapped file of columns: timestamps (float64, append order),
+    number of faces (uint8, 0 while nobody was there) and one float32 column per emotion
+    score in percent (NaN without a face). The row count in the header is written after the
+    row itself, so a crash never leaves a half written row behind.
+    """
+    def __init__(self, path, labels, capacity=SEGMENT_ROWS, create=False, readonly=False):
+        self.path = path
+        self.labels = labels
+        if create:
+            with open(path, 'xb') as f: # Never truncates an existing segment
+                f.truncate(Segment.size(capacity, len(labels))) # Sparse, pages are allocated on write
+        self.file = np.memmap(path, dtype=np.uint8, mode='r' if readonly else 'r+')
+        data = self.file.view(np.ndarray) # Plain views, element access on np.memmap is slower
+        self.header = data[:HEADER_BYTES].view(np.int64)
+        self.bounds = data[:HEADER_BYTES].view(np.float64)
+        if create:
+            self.header[_MAGIC] = MAGIC
+            self.header[_CAPACITY] = capacity
+            self.header[_ROWS] = 0
+        elif self.header[_MAGIC] != MAGIC:
+            raise ValueError(f"{path} is not a session log segment")
+        self.capacity = int(self.header[_CAPACITY])
+        offset = HEADER_BYTES
+        self.times = data[offset:offset + 8 * self.capacity].view(np.float64)
+        offset += 8 * self.capacity
+        self.faces = data[offset:offset + self.capacity]
+        offset += self.capacity + (-self.capacity % 8)
+        self.scores = data[offset:offset + 4 * self.capacity * len(labels)].view(np.float32).reshape(len(labels), self.capacity)
+
+    @staticmethod
+    def size(capacity, columns):
+        return HEADER_BYTES + 8 * capacity + capacity + (-capacity % 8) + 4 * capacity * columns
+
+    @property
+    def rows(self):
+        return int(self.header[_ROWS])
+
+    @property
+    def first_time(self):
+        return float(self.bounds[_FIRST]) if self.rows else None
+
+    @property
+    def last_time(self):
+        return float(self.bounds[_LAST]) if self.rows else None
+
+    @property
+    def full(self):
+        return self.rows >= self.capacity
+
+    def append(self, timestamp, row, faces):
+        i = self.rows
+        self.times[i] = timestamp
+        self.faces[i] = faces
+        self.scores[:, i] = row
+        if i == 0:
+            self.bounds[_FIRST] = timestamp
+        self.bounds[_LAST] = timestamp
+        self.header[_ROWS] = i + 1
+
+    def slice(self, start, end):
+        """Row range [first, last) of the timestamps in [start, end), a binary search per bound"""
+        times = self.times[:self.rows]
+        return int(np.searchsorted(times, start, 'left')), int(np.searchsorted(times, end, 'left'))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            if self.file.mode != 'r':
+                self.file.flush()
+            # The mapping is released with the last view on it
+            self.times = self.faces = self.scores = self.header = self.bounds = None
+            self.file = None
+
+
+class SessionLog:
+    """
+    Append-only columnar log of every analyzed frame plus trigger and track events, kept
+    across sessions. append() writes into the current memory-mapped segment (a few array
+    stores, no system call), a full segment is flushed and the next one created. Range
+    queries find the segments by their first/last timestamps (the time index) and the rows
+    inside them by binary search, aggregations are NumPy reductions over the columns.
+    Events are rare and have free-form fields, they go to a JSON lines file next to it.
+    """
+    def __init__(self, directory=SESSION_LOG_DIR, segment_rows=SEGMENT_ROWS, readonly=False):
+        self.directory = directory
+        self.readonly = readonly
+        self.lock = threading.Lock()
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self.labels = meta['labels'] # Columns keep the order they were created with
+            self.segment_rows = meta['segment_rows']
+        elif readonly:
+            raise FileNotFoundError(f"No session log in {directory}")
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self.labels = list(emotions)
+            self.segment_rows = segment_rows
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'labels': self.labels, 'segment_rows': segment_rows}, f)
+        self.label_index = {label: i for i, label in enumerate(self.labels)}
+
+        names = sorted(name for name in os.listdir(directory) if name.startswith("segment_") and name.endswith(".bin"))
+        # New segments are numbered after every file there, skipped ones included, so none is overwritten
+        self.next_segment = max((int(name[len("segment_"):-len(".bin")]) for name in names if name[len("segment_"):-len(".bin")].isdigit()), default=-1) + 1
+        self.segments = []
+        for name in names:
+            try:
+                self.segments.append(Segment(os.path.join(directory, name), self.labels, readonly=readonly))
+            except ValueError as e:
+                print(f"Skipping {name}: {e}", flush=True)
+        self.events_file = None if readonly else open(os.path.join(directory, EVENTS_FILE), 'a', encoding='utf-8')
+        self.appended = 0
+
+    def _writable_segment(self, timestamp):
+        """The segment for the next row: a new one if the last is full or time went backwards"""
+        segment = self.segments[-1] if self.segments else None
+        if segment is None or segment.full or (segment.rows and timestamp < segment.last_time):
+            if segment is not None:
+                segment.flush()
+            path = os.path.join(self.directory, SEGMENT_PATTERN.format(self.next_segment))
+            segment = Segment(path, self.labels, self.segment_rows, create=True)
+            self.next_segment += 1
+            self.segments.append(segment)
+        return segment
+
+    def append(self, timestamp, scores, faces=None):
+        """
+        One analyzed frame. scores: {emotion: percent} as DeepFace returns it, None when no face
+        was found. faces defaults to 1 with scores and 0 without.
+        """
+        if faces is None:
+            faces = 0 if scores is None else 1
+        row = np.nan if scores is None else [scores.get(label, np.nan) for label in self.labels]
+        with self.lock:
+            self._writable_segment(timestamp).append(timestamp, row, min(faces, 255))
+            self.appended += 1
+
+    def event(self, timestamp, kind, **fields):
+        """e.g. event(t, 'trigger', rule='Sad', track='power'), event(t, 'track', title=...)"""
+        line = json.dumps(dict(fields, time=timestamp, kind=kind))
+        with self.lock:
+            self.events_file.write(line + "\n")
+            self.events_file.flush()
+
+    def _overlapping(self, start, end):
+        if not self.segments:
+            return []
+        firsts = np.array([segment.first_time if segment.rows else np.inf for segment in self.segments])
+        lasts = np.array([segment.last_time if segment.rows else -np.inf for segment in self.segments])
+        return [self.segments[i] for i in np.flatnonzero((firsts < end) & (lasts >= start))]
+
+    def range(self, start=-np.inf, end=np.inf, labels=None):
+        """
+        Columns of all frames with start <= timestamp < end: {'time', 'faces', <emotion>...}.
+        Arrays are copies, in append order.
+        """
+        labels = self.labels if labels is None else labels
+        parts = {'time': [], 'faces': []}
+        parts.update({label: [] for label in labels})
+        with self.lock:
+            for segment in self._overlapping(start, end):
+                first, last = segment.slice(start, end)
+                parts['time'].append(segment.times[first:last])
+                parts['faces'].append(segment.faces[first:last])
+                for label in labels:
+                    parts[label].append(segment.scores[self.label_index[label], first:last])
+            empty = {'time': np.float64, 'faces': np.uint8}
+            return {name: np.concatenate(columns) if columns else np.zeros(0, dtype=empty.get(name, np.float32))
+                    for name, columns in parts.items()}
+
+    def aggregate(self, start=-np.inf, end=np.inf):
+        """
+        Summary of [start, end): frame counts, mean score per emotion over the frames with a
+        face, the share of those frames each emotion was dominant in and the first/last time.
+        """
+        labels = len(self.labels)
+        frames = present = 0
+        sums = np.zeros(labels)
+        dominant = np.zeros(labels)
+        first_time = last_time = None
+        with self.lock:
+            # Reduced in place segment by segment, nothing is copied out of the mapping
+            for segment in self._overlapping(start, end):
+                first, last = segment.slice(start, end)
+                if first == last:
+                    continue
+                faces = segment.faces[first:last] > 0
+                scores = segment.scores[:, first:last]
+                frames += last - first
+                present += int(faces.sum())
+                sums += scores.sum(axis=1, where=faces, dtype=np.float64)
+                dominant += np.bincount(scores.argmax(axis=0), weights=faces, minlength=labels)
+                first_time = float(segment.times[first]) if first_time is None else first_time
+                last_time = float(segment.times[last - 1])
+        mean = sums / present if present else sums
+        dominant = dominant / present * 100 if present else dominant
+        return {
+            'frames': frames,
+            'present': present,
+            'start': first_time,
+            'end': last_time,
+            'mean': {label: float(value) for label, value in zip(self.labels, mean)},
+            'dominant': {label: float(value) for label, value in zip(self.labels, dominant)},
+        }
+
+    def events(self, start=-np.inf, end=np.inf, kind=None):
+        """Events with start <= time < end in the order they were logged, optionally of one kind"""
+        path = os.path.join(self.directory, EVENTS_FILE)
+        if not os.path.exists(path):
+            return []
+        found = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue # A line cut off by a crash
+                if start <= event['time'] < end and (kind is None or event['kind'] == kind):
+                    found.append(event)
+        return found
+
+    def flush(self):
+        with self.lock:
+            if self.segments and not self.readonly:
+                self.segments[-1].flush()
+
+    def stats(self):
+        rows = sum(segment.rows for segment in self.segments)
+        return f"{rows} frames in {len(self.segments)} segments, {self.appended} this session"
+
+    def close(self):
+        with self.lock:
+            for segment in self.segments:
+                segment.close()
+            self.segments = []
+            if self.events_file is not None:
+                self.events_file.close()
+                self.events_file = None
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import queue
+import threading
+
+import soundfile as sf
+
+from func_lib.metrics import get_metrics
+from func_lib.music import AudioClip
+
+# Rendered announcements are kept between runs
+ANNOUNCEMENT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "music_feel", "announcements")
+
+
+class Announcements:
+    """
+    Fixed announcement texts rendered to audio once and kept as AudioClips in memory.
+    pyttsx3 wants all calls on one thread, so rendering runs on its own worker;
+    get() never waits for it and returns None while a text is not ready yet.
+    """
+    def __init__(self, directory=ANNOUNCEMENT_DIR):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+        self.clips = {}
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._render_loop, daemon=True)
+        self.thread.start()
+
+    def _path(self, text):
+        return os.path.join(self.directory, hashlib.sha1(text.encode('utf-8')).hexdigest() + ".wav")
+
+    def prepare(self, texts):
+        """Queues texts for rendering, already rendered ones are skipped"""
+        for text in texts:
+            if text and text not in self.clips:
+                self.queue.put(text)
+
+    def get(self, text):
+        return self.clips.get(text)
+
+    def _load(self, text):
+        data, samplerate = sf.read(self._path(text), dtype='float32', always_2d=True)
+        self.clips[text] = AudioClip(data, samplerate)
+
+    def _render_loop(self):
+        engine = None
+        while True:
+            texts = [self.queue.get()]
+            while not self.queue.empty():
+                texts.append(self.queue.get())
+            texts = [text for text in dict.fromkeys(texts) if text not in self.clips]
+
+            missing = [text for text in texts if not os.path.exists(self._path(text))]
+            if missing:
+                try:
+                    if engine is None:
+                        import pyttsx3 # Only loaded once there is something to render
+
+                        engine = pyttsx3.init()
+                    with get_metrics().timer('tts_render_seconds'):
+                        for text in missing:
+                            engine.save_to_file(text, self._path(text))
+                        engine.runAndWait()
+                except Exception as e:
+                    print(f"Error rendering announcements: {e}", flush=True)
+
+            for text in texts:
+                try:
+                    self._load(text)
+                except Exception as e:
+                    print(f"Error loading announcement '{text}': {e}", flush=True)
+                    try:
+                        os.remove(self._path(text)) # Broken render, try again on the next prepare()
+                    except OSError:
+                        pass
@@ -0,0 +1,193 @@
+import collections
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import sclib
+from requests.adapters import HTTPAdapter
+from sclib import util
+
+from func_lib.metrics import get_metrics
+
+POOL_SIZE = 16 # Keep-alive connections per host
+MAX_RETRIES = 3 # Extra attempts after a failed request
+BACKOFF_BASE = 0.25 # Seconds before the first retry, doubles with every attempt
+BACKOFF_MAX = 4.0
+TIMEOUT = (5.0, 15.0) # Connect and read timeout in seconds
+RETRY_STATUS = (429, 500, 502, 503, 504)
+RECENT_REQUESTS = 500 # Requests kept for the latency percentiles
+
+SOUNDCLOUD_API = "https://api-v2.soundcloud.com"
+
+
+class Transport:
+    """
+    One pooled requests.Session for all HTTP traffic, so connections (and their TLS
+    handshakes) are reused between API calls and track downloads.
+    get() retries connection errors, timeouts and 429/5xx answers with jittered
+    exponential backoff and takes an optional byte range. Latency (until the headers
+    arrive) and bytes are recorded per request, streamed bodies count their bytes
+    when they are read through iter_content().
+    """
+    def __init__(self, pool_size=POOL_SIZE, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, timeout=TIMEOUT):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.recent = collections.deque(maxlen=RECENT_REQUESTS) # Records of the last requests
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0 # Requests that failed after all retries
+        self.bytes = 0
+
+    def backoff(self, attempt):
+        """Full jitter: a random wait up to the exponential backoff of this attempt"""
+        return random.uniform(0.0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, url, stream=False, headers=None, byte_range=None, timeout=None):
+        """
+        GET with retries. byte_range is (first, last) with last=None for the rest of the file.
+        A streamed response is returned with its body unread, close it when done.
+        """
+        headers = dict(headers or {})
+        if byte_range is not None:
+            first, last = byte_range
+            headers['Range'] = f"bytes={first}-{'' if last is None else last}"
+
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            try:
+                response = self.session.get(url, stream=stream, headers=headers, timeout=timeout or self.timeout)
+                if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                    response.close()
+                    raise requests.exceptions.RetryError(f"HTTP {response.status_code} for {url}")
+                body_bytes = 0 if stream else len(response.content)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError, requests.exceptions.RetryError) as e:
+                with self.lock:
+                    if attempt < self.max_retries:
+                        self.retries += 1
+                    else:
+                        self.errors += 1
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                print(f"Request failed ({e}), retrying in {delay:.2f}s", flush=True)
+                time.sleep(delay)
+                continue
+
+            record = {'url': url, 'status': response.status_code, 'latency': time.monotonic() - start, 'bytes': body_bytes, 'attempts': attempt + 1}
+            response.transport_record = record
+            get_metrics().observe('http_first_byte_seconds', record['latency'])
+            with self.lock:
+                self.requests += 1
+                self.bytes += record['bytes']
+                self.recent.append(record)
+            return response
+
+    def get_json(self, url):
+        response = self.get(url)
+        response.raise_for_status()
+        return response.json()
+
+    def iter_content(self, response, chunk_size):
+        """response.iter_content() that counts the bytes of a streamed response"""
+        record = getattr(response, 'transport_record', None)
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if record is not None:
+                record['bytes'] += len(chunk)
+            with self.lock:
+                self.bytes += len(chunk)
+            yield chunk
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(record['latency'] for record in self.recent)
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 4) if latencies else None
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'latency_p50': percentile(0.5),
+            'latency_p95': percentile(0.95),
+            'latency_max': round(latencies[-1], 4) if latencies else None,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_transport():
+    """The Transport shared by the whole process"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Transport()
+        return _shared
+
+
+class SoundcloudAPI(sclib.SoundcloudAPI):
+    """
+    sclib's client with every request going through a Transport instead of urllib.
+    api_base replaces https://api-v2.soundcloud.com in the endpoints, e.g. for a local stand-in.
+    """
+    def __init__(self, client_id=None, transport=None, api_base=None):
+        super().__init__(client_id)
+        self.transport = transport if transport is not None else get_transport()
+        if api_base:
+            self.RESOLVE_URL = self.RESOLVE_URL.replace(SOUNDCLOUD_API, api_base)
+            self.TRACKS_URL = self.TRACKS_URL.replace(SOUNDCLOUD_API, api_base)
+
+    def get_obj(self, url):
+        return self.transport.get_json(url)
+
+    def get_page(self, url):
+        response = self.transport.get(url)
+        response.raise_for_status()
+        return response.text
+
+    def get_credentials(self):
+        page_text = self.get_page(random.choice(util.SCRAPE_URLS))
+        for script in util.find_script_urls(page_text):
+            if self.client_id:
+                break
+            if isinstance(script, str) and script:
+                self.client_id = util.find_client_id(self.get_page(script))
+
+    def resolve(self, url):
+        if not self.client_id:
+            self.get_credentials()
+        obj = self.get_obj(self.RESOLVE_URL.format(url=url, client_id=self.client_id))
+        if obj['kind'] == 'track':
+            return sclib.Track(obj=obj, client=self)
+        if obj['kind'] in ('playlist', 'system-playlist'):
+            playlist = sclib.Playlist(obj=obj, client=self)
+            playlist.clean_attributes()
+            return playlist
+        return None
+
+    def get_tracks(self, *track_ids):
+        urls = self._format_get_tracks_urls(track_ids)
+        with ThreadPoolExecutor(max_workers=max(1, len(urls))) as pool:
+            pages = list(pool.map(self.get_obj, urls))
+        order = {track_id: i for i, track_id in enumerate(track_ids)}
+        return sorted((track for page in pages for track in page), key=lambda track: order.get(track['id'], len(order)))
+
+    def get_stream_url(self, track):
+        """Signed stream URL of a track, other track types (cache, local files) answer themselves"""
+        if not isinstance(track, sclib.Track):
+            return track.get_stream_url()
+        return self.get_obj(track.get_prog_url())['url']
@@ -0,0 +1,194 @@
+import json
+import os
+import time
+
+from func_lib.emotion import ABSENT, emotions
+from func_lib.metrics import get_metrics
+
+# Config file with the reaction rules, next to main.py
+TRIGGERS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "triggers.json")
+RELOAD_INTERVAL = 1.0 # Seconds between two checks of the config file's mtime
+
+
+class Rule:
+    """
+    One reaction: if `emotion` is the dominant one over the last `window` seconds
+    with more than `threshold` percent, play `track` (interrupt name or URL)
+    and say `announcement`. A rule fires when its condition becomes true and not
+    again before it was false in between and `cooldown` seconds have passed.
+    """
+    def __init__(self, name, emotion, window, threshold, cooldown, track, announcement=None):
+        self.name = name
+        self.emotion = emotion
+        self.window = float(window)
+        self.threshold = float(threshold)
+        self.cooldown = float(cooldown)
+        self.track = track
+        self.announcement = announcement
+
+        self.active = False # Condition was true at the last evaluation
+        self.last_fired = None
+
+    @classmethod
+    def from_dict(cls, data, labels):
+        if not isinstance(data, dict):
+            raise ValueError(f"Rule {data!r} is not an object")
+        missing = [key for key in ('emotion', 'window', 'threshold', 'track') if key not in data]
+        if missing:
+            raise ValueError(f"Rule {data} is missing {', '.join(missing)}")
+        if data['emotion'] not in labels:
+            raise ValueError(f"Unknown emotion '{data['emotion']}' (known: {', '.join(labels)})")
+        return cls(
+            name=data.get('name', data['emotion']),
+            emotion=data['emotion'],
+            window=data['window'],
+            threshold=data['threshold'],
+            cooldown=data.get('cooldown', 0),
+            track=data['track'],
+            announcement=data.get('announcement'),
+        )
+
+    def copy(self):
+        """Same rule with fresh state"""
+        return Rule(self.name, self.emotion, self.window, self.threshold, self.cooldown, self.track, self.announcement)
+
+    def ready(self, now):
+        return self.last_fired is None or now - self.last_fired >= self.cooldown
+
+    def __repr__(self):
+        return f"Rule({self.name}: {self.emotion} > {self.threshold}% over {self.window}s -> {self.track})"
+
+
+class TriggerConfig:
+    """
+    The rules and interrupt tracks of the config file, reloaded when the file changes.
+    One config can serve many TriggerEngines (e.g. one per client of the service): the file
+    is parsed and checked once, every engine keeps its own copies of the rules and their state.
+    """
+    def __init__(self, path=TRIGGERS_FILE, labels=None, reload_interval=RELOAD_INTERVAL, clock=time.time):
+        self.path = path
+        self.labels = labels if labels is not None else emotions + [ABSENT]
+        self.reload_interval = reload_interval
+        self.clock = clock
+        self.rules = []
+        self.tracks = {}
+        self.version = 0 # Counts successful loads, engines compare it to pick up new rules
+        self.mtime = None
+        self.last_reload_check = 0.0
+        self.load()
+
+    def load(self):
+        """(Re)loads the config, keeps the old rules if the file is broken"""
+        mtime = None
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            if not isinstance(config, dict) or not isinstance(config.get('rules', []), list) or not isinstance(config.get('tracks', {}), dict):
+                raise ValueError('Expected {"rules": [...], "tracks": {...}}')
+            rules = [Rule.from_dict(data, self.labels) for data in config.get('rules', [])]
+        except (OSError, ValueError, TypeError, AttributeError) as e: # TypeError e.g. for "window": null
+            print(f"Error loading triggers from {self.path}: {e}", flush=True)
+            if mtime is not None:
+                self.mtime = mtime # Reported once, retried when the file changes again
+            return False
+
+        self.rules = rules
+        self.tracks = config.get('tracks', {})
+        self.mtime = mtime
+        self.version += 1
+        print(f"Loaded {len(self.rules)} trigger rules from {self.path}.", flush=True)
+        return True
+
+    def maybe_reload(self):
+        now = self.clock()
+        if now - self.last_reload_check < self.reload_interval:
+            return False
+        self.last_reload_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime != self.mtime:
+            return self.load()
+        return False
+
+
+class TriggerEngine:
+    """
+    Evaluates all rules from the config file against an EmotionTimeline.
+    evaluate() is meant to be called on every timeline update: the distribution of
+    every distinct window length is computed once, then all rules are checked in one pass.
+    The config file is reloaded when it changes, without touching camera or player.
+    clock provides the default `now`, e.g. the video time when a recording is replayed.
+    Engines can share one TriggerConfig, otherwise each reads path itself.
+    """
+    def __init__(self, timeline, path=TRIGGERS_FILE, reload_interval=RELOAD_INTERVAL, on_reload=None, clock=time.time, config=None):
+        self.timeline = timeline
+        self.clock = clock
+        self.config = config if config is not None else TriggerConfig(path, timeline.labels, reload_interval)
+        self.on_reload = on_reload
+        self.rules = []
+        self.version = 0 # Version of the config the rules were copied from, 0 = nothing loaded yet
+        self.evaluations = 0
+        self.fired = 0
+        self._sync()
+
+    @property
+    def tracks(self):
+        return self.config.tracks
+
+    def _sync(self):
+        """Copies the config's rules after a (re)load, keeps cooldowns and latches of rules that survived it"""
+        if self.version == self.config.version:
+            return False
+        previous = {rule.name: rule for rule in self.rules}
+        rules = [rule.copy() for rule in self.config.rules]
+        for rule in rules:
+            if rule.name in previous:
+                rule.active = previous[rule.name].active
+                rule.last_fired = previous[rule.name].last_fired
+        self.rules = rules
+        self.version = self.config.version
+        if self.on_reload:
+            self.on_reload(self)
+        return True
+
+    def load(self):
+        """(Re)loads the config file now"""
+        self.config.load()
+        return self._sync()
+
+    def maybe_reload(self):
+        self.config.maybe_reload()
+        return self._sync()
+
+    def evaluate(self, now=None):
+        """Checks all rules, returns the rule that fired (first in config order) or None"""
+        now = self.clock() if now is None else now
+        self.maybe_reload()
+        self.evaluations += 1
+
+        distributions = {}
+        for window in {rule.window for rule in self.rules}:
+            start = max(now - window, self.timeline.start_time)
+            distribution = self.timeline.distribution(start, now)
+            dominant = max(distribution, key=distribution.get)
+            distributions[window] = (distribution, dominant)
+
+        fired = None
+        for rule in self.rules:
+            distribution, dominant = distributions[rule.window]
+            condition = dominant == rule.emotion and distribution[rule.emotion] > rule.threshold
+            if condition and not rule.active and fired is None and rule.ready(now):
+                rule.last_fired = now
+                fired = rule
+            # A rule that could not fire (cooldown or another rule won) stays armed
+            rule.active = condition and (rule is fired or rule.active)
+        if fired:
+            self.fired += 1
+            get_metrics().inc('triggers_fired_total')
+        return fired
+
+    def stats(self):
+        return {'rules': len(self.rules), 'evaluations': self.evaluations, 'fired': self.fired}
@@ -0,0 +1,408 @@
+import threading
+import time
+
+import cv2
+
+from func_lib.metrics import get_metrics
+
+# Face gating
+DETECT_WIDTH = 320 # Frames are downscaled to this width for the Haar cascade
+REUSE_FRAMES = 4 # Frames between two detections that reuse the last face box
+FACE_MARGIN = 0.2 # Extra border around the detected face, relative to its size
+
+# Adaptive scheduling
+CPU_BUDGET = 0.5 # Share of one core the emotion model may use
+MIN_INTERVAL = 0.1 # Fastest analysis rate (seconds between two runs)
+MAX_INTERVAL = 2.0 # Slowest analysis rate while nothing happens
+STABLE_SECONDS = 10.0 # Emotion unchanged this long -> back off
+MOTION_THRESHOLD = 6.0 # Mean grayscale difference (0-255) of the thumbnails that counts as movement
+MIN_DETECT_WIDTH = 160
+MAX_DETECT_WIDTH = 480
+
+# Face tracking (room mode)
+TRACK_IOU = 0.3 # Minimum overlap of a box with a track's last box to continue that track
+TRACK_MAX_MISSED = 5 # Detections a track may miss before its face counts as gone
+
+metrics = get_metrics()
+
+
+class LatestSlot:
+    """
+    Holds only the newest value, a put() replaces whatever was there.
+    Readers remember the sequence number they saw last and wait for a newer one,
+    values they never saw count as dropped for that reader.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._value = None
+        self.seq = 0
+        self.closed = False
+
+    def put(self, value):
+        with self._cond:
+            self._value = value
+            self.seq += 1
+            self._cond.notify_all()
+
+    def get(self, after_seq=0, timeout=None):
+        """Waits for a value newer than after_seq. Returns (seq, value), value is None on timeout/close"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or self.seq > after_seq, timeout)
+            if self.seq <= after_seq:
+                return after_seq, None
+            return self.seq, self._value
+
+    def peek(self):
+        with self._cond:
+            return self.seq, self._value
+
+    def depth(self, after_seq):
+        """Values waiting for a reader that has seen after_seq (0 or 1, older ones are gone)"""
+        return 1 if self.seq > after_seq else 0
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class CaptureStage(threading.Thread):
+    """Reads the camera as fast as it delivers and keeps only the newest (timestamp, frame)"""
+    def __init__(self, cap, clock=time.time):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.clock = clock
+        self.frames = LatestSlot()
+        self.stop_event = threading.Event()
+        self.captured = 0
+        self.failed = False # Camera stopped delivering frames
+
+    def run(self):
+        while not self.stop_event.is_set():
+            with metrics.timer('capture_read_seconds'):
+                ret, frame = self.cap.read()
+            if not ret:
+                self.failed = True
+                break
+            self.captured += 1
+            self.frames.put((self.clock(), frame))
+        self.frames.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        return {'captured': self.captured}
+
+
+class InferenceStage(threading.Thread):
+    """
+    Runs analyze(frame) on the newest captured frame whenever it is free.
+    Frames that arrive while the model is busy are skipped, never queued.
+    With a scheduler, frames it declines are skipped as well.
+    Results are published as (frame timestamp, result) in self.results.
+    """
+    def __init__(self, frames, analyze, scheduler=None):
+        super().__init__(daemon=True)
+        self.frames = frames
+        self.analyze = analyze
+        self.scheduler = scheduler
+        self.results = LatestSlot()
+        self.stop_event = threading.Event()
+        self.last_seq = 0
+        self.processed = 0
+        self.skipped = 0 # Captured frames the model never saw
+        self.errors = 0
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            seq, item = self.frames.get(self.last_seq, timeout=0.5)
+            if item is None:
+                if self.frames.closed:
+                    break
+                continue
+            self.skipped += seq - self.last_seq - 1
+            self.last_seq = seq
+            timestamp, frame = item
+            if self.scheduler and not self.scheduler.should_run(frame, timestamp):
+                continue
+            start = time.time()
+            try:
+                result = self.analyze(frame)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error: {e}")
+                continue
+            self.last_latency = time.time() - start
+            metrics.observe('inference_seconds', self.last_latency)
+            if self.scheduler:
+                self.scheduler.update(self.last_latency)
+            self.total_latency += self.last_latency
+            self.processed += 1
+            self.results.put((timestamp, result))
+        self.results.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        return {
+            'scheduler': self.scheduler.stats() if self.scheduler else None,
+            'processed': self.processed,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'queue_depth': self.frames.depth(self.last_seq),
+            'last_latency': self.last_latency,
+            'avg_latency': self.total_latency / self.processed if self.processed else 0.0,
+        }
+
+
+class DisplayStats:
+    """Counters for the UI loop, which renders every frame it gets at camera rate"""
+    def __init__(self):
+        self.last_seq = 0
+        self.rendered = 0
+        self.dropped = 0
+        self.started = time.time()
+
+    def shown(self, seq):
+        if self.last_seq:
+            self.dropped += max(0, seq - self.last_seq - 1)
+        self.last_seq = seq
+        self.rendered += 1
+
+    @property
+    def fps(self):
+        elapsed = time.time() - self.started
+        return self.rendered / elapsed if elapsed > 0 else 0.0
+
+    def stats(self, frames):
+        return {'rendered': self.rendered, 'dropped': self.dropped, 'queue_depth': frames.depth(self.last_seq), 'fps': self.fps}
+
+
+class FaceGate:
+    """
+    Cheap face detection in front of the emotion model.
+    The Haar cascade runs on a downscaled grayscale frame and its box is reused for
+    a few frames in between. No face -> the caller can skip the model entirely,
+    otherwise only the (square, padded) face crop goes to the model.
+    """
+    def __init__(self, cascade, detect_width=DETECT_WIDTH, reuse_frames=REUSE_FRAMES, margin=FACE_MARGIN):
+        self.cascade = cascade
+        self.detect_width = detect_width
+        self.reuse_frames = reuse_frames
+        self.margin = margin
+        self.last_box = None
+        self.last_boxes = [] # All faces of the last detection, for locate_all()
+        self.frames_since_detection = 0
+        self.detections = 0
+        self.reused = 0
+        self.absent = 0
+
+    def detect(self, frame):
+        """All face boxes (x, y, w, h) in full resolution coordinates, largest first"""
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.detect_width / width)
+        small = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA) if scale < 1.0 else frame
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        gray = cv2.equalizeHist(gray)
+        with metrics.timer('face_detect_seconds'):
+            faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+        boxes = [tuple(int(v / scale) for v in face) for face in faces]
+        return sorted(boxes, key=lambda box: box[2] * box[3], reverse=True)
+
+    def locate(self, frame):
+        """Box of the main face, or None if nobody is there"""
+        if self.last_box is not None and self.frames_since_detection < self.reuse_frames:
+            self.frames_since_detection += 1
+            self.reused += 1
+            return self.last_box
+        self.detections += 1
+        boxes = self.detect(frame)
+        self.last_box = boxes[0] if boxes else None
+        self.frames_since_detection = 0
+        if self.last_box is None:
+            self.absent += 1
+        return self.last_box
+
+    def locate_all(self, frame):
+        """Boxes of all faces, largest first, reused like locate() between detections"""
+        if self.frames_since_detection < self.reuse_frames and self.last_boxes:
+            self.frames_since_detection += 1
+            self.reused += 1
+            return self.last_boxes
+        self.detections += 1
+        self.last_boxes = self.detect(frame)
+        self.last_box = self.last_boxes[0] if self.last_boxes else None
+        self.frames_since_detection = 0
+        if not self.last_boxes:
+            self.absent += 1
+        return self.last_boxes
+
+    def crop(self, frame, box):
+        """Square crop around the face with some margin, clipped to the frame"""
+        x, y, w, h = box
+        size = int(max(w, h) * (1 + 2 * self.margin))
+        center_x, center_y = x + w // 2, y + h // 2
+        height, width = frame.shape[:2]
+        left = max(0, center_x - size // 2)
+        top = max(0, center_y - size // 2)
+        return frame[top:min(height, top + size), left:min(width, left + size)]
+
+    def stats(self):
+        return {'detections': self.detections, 'reused': self.reused, 'absent': self.absent}
+
+
+def iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    left, top = max(a[0], b[0]), max(a[1], b[1])
+    right, bottom = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class FaceTracker:
+    """
+    Gives every face a stable ID across frames without any model: each new box continues
+    the track whose last box it overlaps most (IoU above min_iou, greedy, best pairs first),
+    boxes without a match start a new track. Tracks unmatched for more than max_missed
+    updates are dropped.
+    """
+    def __init__(self, min_iou=TRACK_IOU, max_missed=TRACK_MAX_MISSED):
+        self.min_iou = min_iou
+        self.max_missed = max_missed
+        self.tracks = {} # face ID -> last box
+        self.missed = {} # face ID -> updates since its last match
+        self.next_id = 1
+
+    def update(self, boxes):
+        """[(face ID, box)] for the boxes of one frame, in the order given"""
+        pairs = sorted(((iou(box, last), i, face_id) for i, box in enumerate(boxes) for face_id, last in self.tracks.items()), reverse=True)
+        assigned = {}
+        matched = set()
+        for overlap, i, face_id in pairs:
+            if overlap < self.min_iou:
+                break
+            if i in assigned or face_id in matched:
+                continue
+            assigned[i] = face_id
+            matched.add(face_id)
+
+        faces = []
+        for i, box in enumerate(boxes):
+            face_id = assigned.get(i)
+            if face_id is None:
+                face_id = self.next_id
+                self.next_id += 1
+            self.tracks[face_id] = box
+            self.missed[face_id] = 0
+            faces.append((face_id, box))
+
+        seen = {face_id for face_id, _ in faces}
+        for face_id in [face_id for face_id in self.tracks if face_id not in seen]:
+            self.missed[face_id] += 1
+            if self.missed[face_id] > self.max_missed:
+                del self.tracks[face_id]
+                del self.missed[face_id]
+        return faces
+
+    def stats(self):
+        return {'tracked': len(self.tracks), 'started': self.next_id - 1}
+
+
+class InferenceScheduler:
+    """
+    Decides when the emotion model runs and at which detection resolution.
+    The interval never drops below what the CPU budget allows for the measured
+    model latency. It grows while the picture is still and the emotion timeline
+    is stable, and snaps back to the fastest allowed rate on movement or a new emotion.
+    When even the slowest rate is over budget the face detection resolution is lowered,
+    with headroom it is raised again.
+    """
+    def __init__(self, timeline=None, face_gate=None, cpu_budget=CPU_BUDGET, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 stable_seconds=STABLE_SECONDS, motion_threshold=MOTION_THRESHOLD, clock=time.time):
+        self.timeline = timeline
+        self.clock = clock
+        self.face_gate = face_gate
+        self.cpu_budget = cpu_budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stable_seconds = stable_seconds
+        self.motion_threshold = motion_threshold
+
+        self.interval = min_interval
+        self.latency = 0.0 # Smoothed model latency
+        self.last_run = 0.0
+        self.last_thumbnail = None
+        self.last_change_seen = None
+        self.motion = 0.0
+        self.runs = 0
+        self.declined = 0
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, (32, 24), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def _budget_interval(self):
+        """Shortest interval that keeps the model within the CPU budget"""
+        return max(self.min_interval, self.latency / self.cpu_budget)
+
+    def _stable(self, now):
+        if self.timeline is None:
+            return True
+        return now - self.timeline.last_change >= self.stable_seconds
+
+    def should_run(self, frame, now=None):
+        now = self.clock() if now is None else now
+        thumbnail = self._thumbnail(frame)
+        if self.last_thumbnail is not None:
+            self.motion = float(cv2.absdiff(thumbnail, self.last_thumbnail).mean())
+        else:
+            self.motion = float('inf')
+
+        # Ramp up: something moves or the emotion just changed
+        changed = self.timeline is not None and self.timeline.last_change != self.last_change_seen
+        if self.motion >= self.motion_threshold or changed:
+            self.interval = self._budget_interval()
+
+        if now - self.last_run < self.interval:
+            self.declined += 1
+            return False
+        self.last_run = now
+        self.last_thumbnail = thumbnail
+        if self.timeline is not None:
+            self.last_change_seen = self.timeline.last_change
+        return True
+
+    def update(self, latency):
+        """Called with the measured latency after every model run"""
+        self.runs += 1
+        self.latency = latency if self.runs == 1 else 0.8 * self.latency + 0.2 * latency
+        budget_interval = self._budget_interval()
+
+        if self.motion < self.motion_threshold and self._stable(self.clock()):
+            # Back off while nothing happens
+            self.interval = min(self.max_interval, max(budget_interval, self.interval * 1.5))
+        else:
+            self.interval = budget_interval
+
+        if self.face_gate is not None:
+            width = self.face_gate.detect_width
+            if budget_interval > self.max_interval:
+                width = max(MIN_DETECT_WIDTH, int(width * 0.75))
+            elif budget_interval <= self.min_interval and self.latency * 2 < self.min_interval * self.cpu_budget:
+                width = min(MAX_DETECT_WIDTH, int(width * 1.25))
+            self.face_gate.detect_width = width
+
+    def stats(self):
+        return {
+            'interval': round(self.interval, 3),
+            'latency': round(self.latency, 4),
+            'motion': round(self.motion, 2) if self.motion != float('inf') else None,
+            'detect_width': self.face_gate.detect_width if self.face_gate is not None else None,
+            'runs': self.runs,
+            'declined': self.declined,
+        }
@@ -0,0 +1,42 @@
+import argparse
+import json
+
+from func_lib.batch import BATCH_SIZE, batch_replay
+from func_lib.replay import SAMPLE_FPS, load_analyzer, replay
+from func_lib.triggers import TRIGGERS_FILE
+
+# Offline replay: runs a recorded session through the same face gate, emotion model and
+# trigger rules as main.py, without camera, player or sleeps.
+# python replay.py session.mp4 --output session.json
+# python replay.py archive.mp4 --workers 16   (long recordings, one process per core)
+
+# Pool workers import this file again, only the process started from the command line runs it
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a recorded video through the emotion pipeline and list the triggers that would have fired.")
+    parser.add_argument('video', help="Video file of the session")
+    parser.add_argument('--triggers', default=TRIGGERS_FILE, help="Rules to evaluate (default: triggers.json)")
+    parser.add_argument('--fps', type=float, default=SAMPLE_FPS, help="Analyzed frames per second of video")
+    parser.add_argument('--start', type=float, default=0.0, help="Start at this many seconds into the video")
+    parser.add_argument('--end', type=float, default=None, help="Stop at this many seconds into the video")
+    parser.add_argument('--workers', type=int, default=None, help="Split the video across this many processes (0: one per core) with batched model calls")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Face crops per model call with --workers")
+    parser.add_argument('--output', help="Write the timeline and triggers as JSON to this file")
+    args = parser.parse_args()
+
+    if args.workers is None:
+        result = replay(args.video, load_analyzer(), triggers_path=args.triggers, sample_fps=args.fps, start=args.start, end=args.end)
+    else:
+        result = batch_replay(args.video, workers=args.workers, triggers_path=args.triggers, sample_fps=args.fps, start=args.start, end=args.end, batch_size=args.batch_size)
+
+    for change_time, emotion in result['timeline']:
+        print(f"{change_time:9.2f}s  {emotion}")
+    print()
+    for trigger in result['triggers']:
+        print(f"{trigger['time']:9.2f}s  {trigger['rule']} -> {trigger['track']}")
+    print()
+    print(f"Distribution: { {emotion: round(share, 1) for emotion, share in result['distribution'].items()} }")
+    print(f"{result['analyzed_frames']} frames analyzed in {result['elapsed']:.1f}s ({result['speed']:.1f}x real time), {len(result['triggers'])} triggers.", flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
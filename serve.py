@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+
+from func_lib.metrics import get_metrics
+from func_lib.runtime import StartupProfile, load_analyzer
+from func_lib.service import BATCH_SIZE, HOST, MAX_CLIENTS, MAX_WAIT, PORT, WORKERS, EmotionService
+from func_lib.triggers import TRIGGERS_FILE
+
+# Headless mode: one box analyzes the frames many desks stream to it and sends their
+# emotion changes and triggers back, see func_lib/service.py for the protocol.
+# python serve.py --host 0.0.0.0 --workers 4
+STATS_INTERVAL = 30.0 # Seconds between two stats lines
+
+
+async def serve(service, host, port):
+    await service.start(host, port)
+    try:
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            print(f"Service: {service.stats()}", flush=True)
+    finally:
+        await service.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the emotion analysis as a service for many clients streaming JPEG frames.")
+    parser.add_argument('--host', default=HOST, help="Address to listen on (default: local clients only)")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--triggers', default=TRIGGERS_FILE, help="Rules evaluated for every client (default: triggers.json)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Faces of different clients per model call")
+    parser.add_argument('--max-wait', type=float, default=MAX_WAIT, help="Seconds a batch waits for more frames")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="Model calls running at once")
+    parser.add_argument('--max-clients', type=int, default=MAX_CLIENTS)
+    parser.add_argument('--metrics-port', type=int, default=None, help="Serve latency histograms in Prometheus format on this port")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        get_metrics().start(port=args.metrics_port)
+    profile = StartupProfile()
+    model = load_analyzer(profile, batched=True) # Warm before the first client connects
+    profile.report()
+    service = EmotionService(model, triggers_path=args.triggers, batch_size=args.batch_size, max_wait=args.max_wait, workers=args.workers, max_clients=args.max_clients)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
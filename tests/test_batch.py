@@ -0,0 +1,15 @@
+import pytest
+
+from benchmarks.standins import write_session_video
+from func_lib.batch import shard_ranges
+from func_lib.replay import read_frames
+
+
+@pytest.mark.parametrize("sample_fps, shards", [(5.0, 3), (5.0, 12), (10.0, 7), (10.0, 12)])
+def test_shards_yield_the_frames_of_a_single_pass(tmp_path, sample_fps, shards):
+    path = write_session_video(str(tmp_path / "session.avi"), seconds=21.0, fps=30.0, size=(64, 48))
+    single = [timestamp for timestamp, _ in read_frames(path, sample_fps, 0.0, 20.0)]
+    sharded = [timestamp for start, end in shard_ranges(0.0, 20.0, shards, sample_fps)
+               for timestamp, _ in read_frames(path, sample_fps, start, end)]
+    assert len(single) == 20 * sample_fps
+    assert sharded == single
@@ -0,0 +1,44 @@
+import asyncio
+
+from benchmarks.standins import CenterGate, StubEmotionModel, session_frames
+from func_lib.service import ClientSession, EmotionService, ServiceClient
+
+FRAMES = 12
+
+
+async def _stream(port, client_id, frames):
+    client = await ServiceClient(client_id).connect(port=port)
+    for i, jpeg in enumerate(frames):
+        await client.send_frame(jpeg, frame_time=i * 0.1)
+        await asyncio.sleep(0.02)
+    await asyncio.sleep(0.2) # Answers to the last frames
+    return client
+
+
+async def _serve(triggers_path):
+    service = await EmotionService(StubEmotionModel(), face_gate_factory=CenterGate, triggers_path=triggers_path).start(port=0)
+    encoder = ServiceClient()
+    frames = [encoder.encode(frame) for frame in session_frames(FRAMES * 0.1, 10.0, (64, 48))]
+    clients = await asyncio.gather(*(_stream(service.port, f"c{i}", frames) for i in range(3)))
+    stats = {client_id: (session.stats(), session.in_flight) for client_id, session in service.clients.items()}
+    for client in clients:
+        await client.close()
+    await service.stop()
+    return stats
+
+
+def test_failing_client_does_not_stall_the_batch(tmp_path, monkeypatch):
+    record = ClientSession.record
+
+    def failing_record(self, frame_time, scores):
+        if self.client_id == 'c0':
+            raise RuntimeError("broken rules")
+        return record(self, frame_time, scores)
+
+    monkeypatch.setattr(ClientSession, 'record', failing_record)
+    stats = asyncio.run(_serve(str(tmp_path / "triggers.json")))
+    assert stats['c0'][0]['errors'] > 1 # Still analyzed after the first failure
+    for client_id in ('c1', 'c2'):
+        client_stats, in_flight = stats[client_id]
+        assert not in_flight
+        assert client_stats['analyzed'] + client_stats['dropped'] == FRAMES
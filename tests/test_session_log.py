@@ -0,0 +1,28 @@
+import numpy as np
+
+from func_lib.session_log import SessionLog
+
+
+def _append(log, times):
+    for t in times:
+        log.append(float(t), {'happy': float(t)})
+
+
+def test_append_after_corrupt_segment_keeps_existing_rows(tmp_path):
+    log = SessionLog(str(tmp_path), segment_rows=4)
+    _append(log, range(8)) # segment_000000 and segment_000001
+    log.close()
+    with open(tmp_path / "segment_000000.bin", 'r+b') as f:
+        f.write(b'\0' * 8) # Broken magic, skipped on open
+
+    log = SessionLog(str(tmp_path), segment_rows=4)
+    assert len(log.segments) == 1
+    _append(log, range(8, 16))
+    times = log.range()['time']
+    assert list(times) == list(range(4, 16))
+    assert np.array_equal(log.range()['happy'], times.astype(np.float32))
+    log.close()
+
+    reopened = SessionLog(str(tmp_path), readonly=True)
+    assert list(reopened.range()['time']) == list(range(4, 16))
+    reopened.close()
@@ -0,0 +1,58 @@
+import json
+import os
+
+import pytest
+
+from func_lib.emotion import EmotionTimeline
+from func_lib.triggers import TriggerConfig, TriggerEngine
+
+RULE = {'name': 'OMG', 'emotion': 'happy', 'window': 5, 'threshold': 60, 'track': 'happy'}
+
+
+def _write(path, config, mtime):
+    path.write_text(config if isinstance(config, str) else json.dumps(config), encoding='utf-8')
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.mark.parametrize("broken", [
+    [RULE], # Top-level list
+    {'rules': [dict(RULE, window=None)]},
+    {'rules': RULE},
+    {'rules': ["happy"]},
+    {'rules': [RULE], 'tracks': []},
+    "{not json",
+])
+def test_reload_keeps_rules_of_a_malformed_file(tmp_path, capsys, broken):
+    path = tmp_path / "triggers.json"
+    _write(path, {'rules': [RULE]}, 1000)
+    engine = TriggerEngine(EmotionTimeline(0.0), path=str(path), reload_interval=0.0, clock=lambda: 10.0)
+    assert [rule.name for rule in engine.rules] == ['OMG']
+
+    _write(path, broken, 2000)
+    engine.evaluate(11.0)
+    engine.evaluate(12.0)
+    assert [rule.name for rule in engine.rules] == ['OMG']
+    assert capsys.readouterr().out.count("Error loading triggers") == 1 # Reported once, not on every check
+
+    _write(path, {'rules': [dict(RULE, name='Fixed')]}, 3000)
+    engine.evaluate(13.0)
+    assert [rule.name for rule in engine.rules] == ['Fixed']
+
+
+def test_engines_share_the_config_but_not_the_rule_state(tmp_path, capsys):
+    path = tmp_path / "triggers.json"
+    _write(path, {'rules': [dict(RULE, window=1, threshold=50)]}, 1000)
+    config = TriggerConfig(str(path), reload_interval=0.0)
+    timelines = [EmotionTimeline(0.0), EmotionTimeline(0.0)]
+    engines = [TriggerEngine(timeline, config=config, clock=lambda: 10.0) for timeline in timelines]
+    timelines[0].record(1.0, 'happy')
+    assert engines[0].evaluate(2.0).name == 'OMG'
+    assert engines[1].evaluate(2.0) is None # Its client was never happy
+
+    _write(path, {'rules': [dict(RULE, window=1, threshold=50, cooldown=60)]}, 2000)
+    engines[0].evaluate(3.0)
+    engines[1].evaluate(3.0)
+    assert [rule.cooldown for engine in engines for rule in engine.rules] == [60, 60]
+    assert engines[0].rules[0].last_fired == 2.0 # Kept across the reload
+    assert engines[1].rules[0].last_fired is None
+    assert capsys.readouterr().out.count("Loaded 1 trigger rules") == 2 # Once per file version, not per engine